@@ -0,0 +1,479 @@
+import asyncio
+import base64
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import fields, make_dataclass
+from decimal import Decimal
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+
+from polybot import (Eip712AuthSigner, PolymarketClient, MarketCatalogStore, Market, decode_market,
+                     decode_markets_page, decode_books, decode_levels, MarketStream, OrderbookMonitor, TopOfBook,
+                     BatchChangeDetector, TokenRegistry)
+
+BENCH_KEY = "0x" + "11" * 32
+
+
+def timed(fn, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return time.perf_counter() - start
+
+
+def synthetic_market(i: int) -> dict:
+    return {
+        "condition_id": f"0x{i:064x}",
+        "question_id": f"0x{i + 1:064x}",
+        "tokens": [
+            {"token_id": str(10 ** 76 + 2 * i), "outcome": "Yes", "price": 0.5, "winner": False},
+            {"token_id": str(10 ** 76 + 2 * i + 1), "outcome": "No", "price": 0.5, "winner": False},
+        ],
+        "rewards": {"rates": None, "min_size": 0, "max_spread": 0},
+        "minimum_order_size": "15",
+        "minimum_tick_size": "0.01",
+        "description": f"This market will resolve to \"Yes\" if event {i} happens before the end date. " * 4,
+        "category": ["Sports", "Politics", "Crypto", "Pop Culture"][i % 4],
+        "end_date_iso": "2027-01-01T00:00:00Z",
+        "game_start_time": None,
+        "question": f"Will event {i} happen?",
+        "market_slug": f"will-event-{i}-happen",
+        "min_incentive_size": "0",
+        "max_incentive_spread": "0",
+        "active": True,
+        "closed": False,
+        "seconds_delay": 0,
+        "icon": f"https://polymarket-upload.s3.us-east-2.amazonaws.com/event-{i}.png",
+        "fpmm": "",
+    }
+
+
+async def serve_markets(markets: list, page_size: int = 500, port: int = 18080, offsets: Optional[list] = None,
+                        short_page: Optional[int] = None, opaque: bool = False,
+                        fail_from: Optional[int] = None) -> web.AppRunner:
+    # local stand-in for the CLOB /markets endpoint with base64 offset cursors. offsets, if given, collects
+    # the offset of each request; the page at offset short_page holds one market less; opaque cursors do not
+    # decode to an offset; requests at or after offset fail_from are answered with 400
+    async def handler(request):
+        cursor = base64.b64decode(request.query.get("next_cursor", "")).decode()
+        offset = int(cursor.removeprefix("page-")) if cursor else 0
+        if offsets is not None:
+            offsets.append(offset)
+        if fail_from is not None and offset >= fail_from:
+            raise web.HTTPBadRequest()
+        end = offset + page_size - (offset == short_page)
+        next_cursor = f"page-{end}" if opaque else str(end)
+        next_cursor = "LTE=" if end >= len(markets) else base64.b64encode(next_cursor.encode()).decode()
+        return web.json_response({"limit": page_size, "count": len(markets[offset:end]),
+                                  "next_cursor": next_cursor, "data": markets[offset:end]})
+
+    app = web.Application()
+    app.router.add_get("/markets", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def serve_book(books: dict, port: int = 18082, gate: Optional[asyncio.Event] = None) -> web.AppRunner:
+    # local stand-in for the CLOB /book endpoint answering from books (asset_id -> book event); if gate is
+    # given, responses wait until it is set
+    async def handler(request):
+        if gate is not None:
+            await gate.wait()
+        return web.json_response(books[request.query["token_id"]])
+
+    app = web.Application()
+    app.router.add_get("/book", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def serve_market_channel(updates_per_asset: int, port: int = 18081, price: str = "0.21",
+                               subscriptions: Optional[list] = None, close_first: int = 0,
+                               mute_first: int = 0, junk_first: int = 0) -> web.AppRunner:
+    # local stand-in for the CLOB market WebSocket channel: answers PING with PONG, sends a book snapshot
+    # for each subscribed asset and then updates_per_asset BUY price_change events at price per asset.
+    # subscriptions, if given, collects each connection's asset list; the first close_first connections
+    # are closed after their updates, the first mute_first connections never answer at all and the first
+    # junk_first connections send a plain-text error frame before the snapshot
+    connections = 0
+
+    async def handler(request):
+        nonlocal connections
+        connections += 1
+        connection = connections
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            if connection <= mute_first:
+                continue
+            if msg.data == "PING":
+                await ws.send_str("PONG")
+                continue
+            assets = json.loads(msg.data)["assets_ids"]
+            if subscriptions is not None:
+                subscriptions.append(assets)
+            if connection <= junk_first:
+                await ws.send_str("INVALID OPERATION")
+            await ws.send_str(json.dumps([{"event_type": "book", **synthetic_book(i), "asset_id": asset_id}
+                                          for i, asset_id in enumerate(assets)]))
+            for k in range(updates_per_asset):
+                await ws.send_str(json.dumps([{
+                    "event_type": "price_change", "market": "0x0", "timestamp": str(k),
+                    "price_changes": [{"asset_id": asset_id, "side": "BUY", "price": price, "size": str(k % 7),
+                                       "hash": f"{k:040x}"}],
+                } for asset_id in assets]))
+            if connection <= close_first:
+                await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws/market", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+def legacy_sign(account, timestamp: int, nonce: int = 0) -> str:
+    # the per-request encode_typed_data path the client used before Eip712AuthSigner
+    data = {
+        "types": {
+            "EIP712Domain": [
+                {"name": "name", "type": "string"},
+                {"name": "version", "type": "string"},
+                {"name": "chainId", "type": "uint256"},
+            ],
+            "Auth": [
+                {"name": "action", "type": "string"},
+                {"name": "timestamp", "type": "uint256"},
+                {"name": "nonce", "type": "uint256"},
+            ],
+        },
+        "domain": {"name": "Polymarket CLOB", "version": "1", "chainId": 137},
+        "primaryType": "Auth",
+        "message": {"action": "Auth", "timestamp": timestamp, "nonce": nonce},
+    }
+    return account.sign_message(encode_typed_data(full_message=data)).signature.hex()
+
+
+def bench_signer(n: int = 2000):
+    account = Account.from_key(BENCH_KEY)
+    signer = Eip712AuthSigner(account)
+    base = int(time.time() * 1000)
+    assert legacy_sign(account, base) == signer.sign(base)
+
+    legacy = timed(lambda i: legacy_sign(account, base + i), n)
+    compiled = timed(lambda i: signer.sign(base + i), n)
+    print(f"signer: encode_typed_data {n / legacy:,.0f} sig/s, "
+          f"Eip712AuthSigner {n / compiled:,.0f} sig/s ({legacy / compiled:.1f}x)")
+
+
+async def _catalog_startup(n: int):
+    markets = [synthetic_market(i) for i in range(n)]
+    runner = await serve_markets(markets)
+    client = PolymarketClient(BENCH_KEY, "http://127.0.0.1:1")
+    client.base_url = "http://127.0.0.1:18080"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MarketCatalogStore(os.path.join(tmp, "markets.db"))
+        try:
+            start = time.perf_counter()
+            loaded = {}
+            async for page in client.iter_market_pages():
+                loaded.update((market.condition_id, market) for market in page.markets)
+            cold = time.perf_counter() - start
+            store.save(loaded.values())
+
+            start = time.perf_counter()
+            warm_loaded = store.load()
+            warm = time.perf_counter() - start
+            assert len(warm_loaded) == len(loaded) == n
+        finally:
+            store.close()
+            await client.close()
+            await runner.cleanup()
+    print(f"catalog startup ({n:,} markets): cold (local /markets) {cold * 1000:,.0f}ms, "
+          f"warm (sqlite) {warm * 1000:,.0f}ms ({cold / warm:.1f}x)")
+
+
+def bench_catalog_startup(n: int = 20000):
+    asyncio.run(_catalog_startup(n))
+
+
+def retained_bytes(payload: str, build) -> int:
+    # memory still held after decoding payload, building records from it and dropping the decoded dicts
+    gc.collect()
+    tracemalloc.start()
+    data = json.loads(payload)
+    records = build(data)
+    del data
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def bench_market_memory(n: int = 20000):
+    payload = json.dumps([synthetic_market(i) for i in range(n)])
+    LegacyMarket = make_dataclass("LegacyMarket", [(field.name, field.type) for field in fields(Market)])
+
+    def build_compact(data):
+        markets = [decode_market(market_data) for market_data in data]
+        for market in markets:
+            market.drop_cold_fields()  # as after the catalog store has persisted them
+        return markets
+
+    before = retained_bytes(payload, lambda data: [LegacyMarket(**market_data) for market_data in data])
+    after = retained_bytes(payload, build_compact)
+    print(f"market memory ({n:,} markets): dataclass {before / n:,.0f} B/market, "
+          f"slotted+interned {after / n:,.0f} B/market ({before / after:.1f}x)")
+
+
+def synthetic_book(i: int, depth: int = 20) -> dict:
+    return {
+        "market": f"0x{i:064x}",
+        "asset_id": str(10 ** 76 + 2 * i),
+        "bids": [{"price": f"{0.01 * (k + 1):.2f}", "size": f"{100 + k}.5"} for k in range(depth)],
+        "asks": [{"price": f"{0.99 - 0.01 * k:.2f}", "size": f"{100 + k}.25"} for k in range(depth)],
+        "hash": f"{i:040x}",
+        "timestamp": "1700000000000",
+    }
+
+
+def bench_decode(n: int = 5000, repeat: int = 3):
+    page = json.dumps({"limit": n, "count": n, "next_cursor": "LTE=",
+                       "data": [synthetic_market(i) for i in range(n)]}).encode()
+    books = json.dumps([synthetic_book(i) for i in range(n // 5)]).encode()
+
+    legacy = min(timed(lambda _: [Market(**data) for data in json.loads(page)["data"]], 1) for _ in range(repeat))
+    typed = min(timed(lambda _: decode_markets_page(page), 1) for _ in range(repeat))
+    print(f"decode /markets page ({len(page) / 1e6:.1f} MB, {n:,} markets): Market(**data) {len(page) / legacy / 1e6:.1f} MB/s, "
+          f"decode_markets_page {len(page) / typed / 1e6:.1f} MB/s")
+
+    raw = min(timed(lambda _: json.loads(books), 1) for _ in range(repeat))
+    typed = min(timed(lambda _: decode_books(books), 1) for _ in range(repeat))
+    levels = min(timed(lambda _: [book.bids for book in decode_books(books)], 1) for _ in range(repeat))
+    print(f"decode /books ({len(books) / 1e6:.1f} MB, {n // 5:,} books): raw dicts {len(books) / raw / 1e6:.1f} MB/s, "
+          f"decode_books {len(books) / typed / 1e6:.1f} MB/s (unchanged books), "
+          f"with levels {len(books) / levels / 1e6:.1f} MB/s (changed books)")
+
+
+async def _stream(assets: int, updates_per_asset: int, shard_size: int):
+    runner = await serve_market_channel(updates_per_asset)
+    expected = assets * (updates_per_asset + 1)
+    received = {"books": 0, "changes": 0}
+    done = asyncio.Event()
+
+    async def on_book(book):
+        received["books"] += 1
+        if received["books"] + received["changes"] >= expected:
+            done.set()
+
+    async def on_price_change(changes):
+        received["changes"] += len(changes)
+        if received["books"] + received["changes"] >= expected:
+            done.set()
+
+    async with aiohttp.ClientSession() as session:
+        stream = MarketStream(session, "http://127.0.0.1:18081/ws/market", on_book, on_price_change, shard_size)
+        start = time.perf_counter()
+        stream.set_assets(str(10 ** 76 + i) for i in range(assets))
+        await asyncio.wait_for(done.wait(), 120)
+        elapsed = time.perf_counter() - start
+        await stream.close()
+    await runner.cleanup()
+    print(f"market stream ({assets:,} assets over {len(range(0, assets, shard_size))} shards): "
+          f"{expected:,} events in {elapsed:.2f}s ({expected / elapsed:,.0f} events/s)")
+
+
+def bench_stream(assets: int = 2000, updates_per_asset: int = 20, shard_size: int = 500):
+    asyncio.run(_stream(assets, updates_per_asset, shard_size))
+
+
+def decimal_levels(levels: list) -> list:
+    # the Decimal decode and diff path used before fixed-point prices
+    return [(Decimal(level["price"]), Decimal(level["size"])) for level in levels]
+
+
+def decimal_top(book: dict) -> tuple:
+    best_bid = max(price for price, _ in decimal_levels(book["bids"]))
+    best_ask = min(price for price, _ in decimal_levels(book["asks"]))
+    return best_bid, best_ask, best_ask - best_bid
+
+
+def decimal_changes(previous: tuple, current: tuple) -> dict:
+    changes = {}
+    for side, prev_best, curr_best in [("bids", previous[0], current[0]), ("asks", previous[1], current[1])]:
+        change_percent = (curr_best - prev_best) / prev_best * 100
+        if abs(change_percent) >= 15:
+            changes[side] = change_percent
+    change_percent = (current[2] - previous[2]) / previous[2] * 100
+    if abs(change_percent) >= 50:
+        changes["spread"] = change_percent
+    return changes
+
+
+def fixed_top(book: dict) -> TopOfBook:
+    best_bid = max(price for price, _ in decode_levels(book["bids"]))
+    best_ask = min(price for price, _ in decode_levels(book["asks"]))
+    return TopOfBook(best_bid, best_ask, best_ask - best_bid, (best_bid + best_ask) / 2)
+
+
+def fixed_changes(previous: TopOfBook, current: TopOfBook) -> dict:
+    # the diff methods do not touch monitor state, so they run unbound here
+    changes = OrderbookMonitor.calculate_price_changes(None, previous, current)
+    spread_change = OrderbookMonitor.calculate_spread_change(None, previous.spread, current.spread)
+    if spread_change is not None:
+        changes["spread"] = spread_change
+    return changes
+
+
+def bench_price_math(n: int = 20000, repeat: int = 5):
+    before = [synthetic_book(i) for i in range(n)]
+    after = [synthetic_book(i) for i in range(n)]
+    for book in after[::3]:  # a third of the books move their best bid down 5 ticks
+        book["bids"][-1]["price"] = f"{float(book['bids'][-1]['price']) - 0.05:.2f}"
+
+    def best(fn):
+        return min(timed(lambda _: fn(), 1) for _ in range(repeat))
+
+    decimal_tops = [(decimal_top(previous), decimal_top(current)) for previous, current in zip(before, after)]
+    fixed_tops = [(fixed_top(previous), fixed_top(current)) for previous, current in zip(before, after)]
+    assert ([sorted(decimal_changes(*pair)) for pair in decimal_tops]
+            == [sorted(fixed_changes(*pair)) for pair in fixed_tops])
+
+    decimal = best(lambda: [decimal_top(book) for book in after])
+    fixed = best(lambda: [fixed_top(book) for book in after])
+    print(f"price decode ({n:,} books x 40 levels): Decimal {n / decimal:,.0f} books/s, "
+          f"fixed-point {n / fixed:,.0f} books/s ({decimal / fixed:.1f}x)")
+    decimal = best(lambda: [decimal_changes(*pair) for pair in decimal_tops])
+    fixed = best(lambda: [fixed_changes(*pair) for pair in fixed_tops])
+    print(f"price diff ({n:,} book pairs): Decimal {n / decimal:,.0f} pairs/s, "
+          f"fixed-point {n / fixed:,.0f} pairs/s ({decimal / fixed:.1f}x)")
+
+
+def random_top(rng: random.Random) -> TopOfBook:
+    best_bid = rng.choice([None, rng.randrange(1, 990) * 1000])
+    best_ask = rng.choice([None, rng.randrange(10, 1000) * 1000])
+    if best_bid is None or best_ask is None:
+        return TopOfBook(best_bid, best_ask, None, None)
+    return TopOfBook(best_bid, best_ask, best_ask - best_bid, (best_bid + best_ask) / 2)
+
+
+def bench_batch_detect(n: int = 100000, repeat: int = 5):
+    rng = random.Random(1)
+    token_ids = [str(10 ** 76 + i) for i in range(n)]
+    previous = [random_top(rng) for _ in range(n)]
+    current = [top if rng.random() < 0.9 else random_top(rng) for top in previous]
+
+    detector = BatchChangeDetector()
+    for index, top in enumerate(previous):
+        detector.update(index, top)
+    detector.roll()
+    for index, top in enumerate(current):
+        detector.update(index, top)
+
+    def scalar(_):
+        triggered = []
+        for token_id, prev_top, curr_top in zip(token_ids, previous, current):
+            changes = fixed_changes(prev_top, curr_top)
+            if changes:
+                triggered.append(token_id)
+        return triggered
+
+    assert scalar(0) == [token_ids[index] for index, _, _ in detector.detect()]
+    per_token = min(timed(scalar, 1) for _ in range(repeat))
+    batch = min(timed(lambda _: detector.detect(), 1) for _ in range(repeat))
+    print(f"change detection ({n:,} tokens, {len(detector.detect()):,} triggered): per-token {per_token * 1000:,.1f}ms, "
+          f"vectorized {batch * 1000:,.1f}ms ({per_token / batch:.1f}x)")
+
+
+def traced_bytes(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    state = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del state
+    return size
+
+
+def bench_token_state(n: int = 100000, repeat: int = 5):
+    rng = random.Random(1)
+    token_ids = [str(rng.randrange(10 ** 76, 10 ** 77)) for _ in range(n)]
+    tops = [random_top(rng) for _ in range(n)]
+
+    def build_dicts():
+        # the layout before the registry: book, baseline and detector slot each in a dict keyed by token id
+        books, baselines, slots = {}, {}, {}
+        for index, (token_id, top) in enumerate(zip(token_ids, tops)):
+            books[token_id] = baselines[token_id] = top
+            slots[token_id] = index
+        return books, baselines, slots
+
+    def build_registry():
+        registry = TokenRegistry()
+        for token_id, top in zip(token_ids, tops):
+            index = registry.id(token_id)
+            registry.books[index] = registry.baselines[index] = top
+        return registry
+
+    before = traced_bytes(build_dicts)
+    after = traced_bytes(build_registry)
+    print(f"token state memory ({n:,} tokens, excluding ids and books): three dicts {before / n:,.0f} B/token, "
+          f"registry {after / n:,.0f} B/token ({before / after:.1f}x)")
+
+    books, baselines, slots = build_dicts()
+    registry = build_registry()
+
+    def incoming():
+        # token ids as decoded from a fresh response: equal strings whose hashes are not cached yet
+        return [token_id.encode().decode() for token_id in token_ids]
+
+    def dict_lookups(batch):
+        for token_id in batch:
+            books.get(token_id)
+            baselines[token_id] = baselines.get(token_id)
+            slots.get(token_id)
+
+    def registry_lookups(batch):
+        ids, books, baselines = registry.ids, registry.books, registry.baselines
+        for token_id in batch:
+            index = ids[token_id]
+            baselines[index] = books[index]
+
+    dicts = min(timed(lambda _, batch=incoming(): dict_lookups(batch), 1) for _ in range(repeat))
+    indexed = min(timed(lambda _, batch=incoming(): registry_lookups(batch), 1) for _ in range(repeat))
+    print(f"token state lookup ({n:,} fresh ids): three dicts {dicts / n * 1e9:,.0f} ns/book, "
+          f"registry {indexed / n * 1e9:,.0f} ns/book ({dicts / indexed:.1f}x)")
+
+
+BENCHMARKS = {
+    "signer": bench_signer,
+    "catalog_startup": bench_catalog_startup,
+    "market_memory": bench_market_memory,
+    "decode": bench_decode,
+    "stream": bench_stream,
+    "price_math": bench_price_math,
+    "batch_detect": bench_batch_detect,
+    "token_state": bench_token_state,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
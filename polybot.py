@@ -4,23 +4,74 @@ import time
 import logging
 from logging.handlers import RotatingFileHandler
 import os
+import sys
+import json
+import hmac
+import hashlib
+import base64
+import binascii
+import sqlite3
+import heapq
+import bisect
+import random
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 from eth_account import Account
-from eth_account.messages import encode_typed_data
+from eth_utils import keccak
 from web3 import Web3
-from decimal import Decimal
-from typing import List, Dict, Optional
-from dataclasses import dataclass
+import numpy as np
+from typing import List, Dict, Optional, Callable, AsyncIterator, Iterable, Tuple, Set, Awaitable
+from dataclasses import dataclass, asdict, fields
 from telegram import Bot
 
 # config
 from config import PRIVATE_KEY, POLYGON_RPC_URL, TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
 
+BOOKS_BATCH_SIZE = 500  # max token ids per POST /books request
+WS_MARKET_URL = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+WS_SHARD_SIZE = 500  # asset ids per market-channel connection
+END_CURSOR = "LTE="  # base64("-1"), returned with the last /markets page
+
+# default request rates (requests per second) per CLOB endpoint, from the published limits per 10 s window;
+# endpoints not listed use DEFAULT_RATE_LIMIT. A bucket bursts half a window and refills at half the rate, so a
+# full burst plus what refills within the same window never exceeds the limit, while catalog fan-out and
+# /books chunks still go out concurrently.
+RATE_LIMITS = {
+    "/markets": 25,
+    "/markets/{condition_id}": 5,
+    "/book": 20,
+    "/books": 8,
+    "/spread": 20,
+}
+DEFAULT_RATE_LIMIT = 5
+RATE_LIMIT_WINDOW = 10  # seconds the published limits are counted over
+MAX_THROTTLE_RETRIES = 5  # attempts after a 429 before the error is raised
+
+# auth policy per CLOB endpoint; endpoints not listed here use L2 (falling back to L1 without API credentials)
+AUTH_PUBLIC = "public"
+AUTH_L1 = "l1"
+AUTH_L2 = "l2"
+ENDPOINT_AUTH = {
+    "/markets": AUTH_PUBLIC,
+    "/markets/{condition_id}": AUTH_PUBLIC,
+    "/book": AUTH_PUBLIC,
+    "/books": AUTH_PUBLIC,
+    "/spread": AUTH_PUBLIC,
+    "/auth/api-key": AUTH_L1,
+    "/auth/derive-api-key": AUTH_L1,
+}
+
 @dataclass
 class BookParams:
     token_id: str
     side: str = None
 
-@dataclass
+# low-cardinality Market fields that are interned so markets share one copy of each value
+INTERNED_FIELDS = ("minimum_order_size", "minimum_tick_size", "category", "min_incentive_size", "max_incentive_spread")
+# bulky text only needed for alerts; kept in the catalog store rather than in memory
+COLD_FIELDS = ("description", "icon")
+
+@dataclass(slots=True)
 class Market:
     condition_id: str
     question_id: str
@@ -28,7 +79,7 @@ class Market:
     rewards: Dict
     minimum_order_size: str
     minimum_tick_size: str
-    description: str
+    description: Optional[str]
     category: str
     end_date_iso: str
     game_start_time: str
@@ -39,94 +90,1242 @@ class Market:
     active: bool
     closed: bool
     seconds_delay: int
-    icon: str
+    icon: Optional[str]
     fpmm: str
 
+    def __post_init__(self):
+        for name in INTERNED_FIELDS:
+            value = getattr(self, name)
+            if isinstance(value, str):
+                setattr(self, name, sys.intern(value))
+        self.tokens = [{sys.intern(key): sys.intern(value) if key == "outcome" and isinstance(value, str) else value
+                        for key, value in token.items()}
+                       for token in self.tokens or []]
+
+    def drop_cold_fields(self):
+        for name in COLD_FIELDS:
+            setattr(self, name, None)
+
+@dataclass
+class ApiCredentials:
+    api_key: str
+    secret: str
+    passphrase: str
+
+# prices and sizes are fixed-point ints in millionths from decode onward (USDC has 6 decimals and the
+# finest CLOB tick is 0.0001), so the diff engine never touches Decimal
+FIXED_SCALE = 10 ** 6
+
+def parse_fixed(text: str) -> int:
+    # exact for CLOB precision: 6 decimals are far inside float's 15-16 significant digits
+    return round(float(text) * FIXED_SCALE)
+
+def format_fixed(value: int) -> str:
+    whole, frac = divmod(abs(value), FIXED_SCALE)
+    sign = "-" if value < 0 else ""
+    return f"{sign}{whole}.{frac:06d}".rstrip("0").rstrip(".")
+
+Level = Tuple[int, int]  # (price, size)
+
+class OrderBook:
+    # Levels may be given as a loader that is run on first access to bids or asks. decode_book and
+    # complement_book use one, so a book the hash check finds unchanged is never parsed past its header.
+    __slots__ = ("asset_id", "market", "hash", "timestamp", "_bids", "_asks", "_loader")
+
+    def __init__(self, asset_id: str, market: str, bids: Optional[List[Level]], asks: Optional[List[Level]],
+                 hash: Optional[str], timestamp: Optional[str],
+                 loader: Optional[Callable[[], Tuple[List[Level], List[Level]]]] = None):
+        self.asset_id = asset_id
+        self.market = market
+        self.hash = hash
+        self.timestamp = timestamp
+        self._bids = bids
+        self._asks = asks
+        self._loader = loader
+
+    @property
+    def bids(self) -> List[Level]:
+        if self._loader is not None:
+            self._load()
+        return self._bids
+
+    @property
+    def asks(self) -> List[Level]:
+        if self._loader is not None:
+            self._load()
+        return self._asks
+
+    def _load(self):
+        self._bids, self._asks = self._loader()
+        self._loader = None
+
+@dataclass(slots=True)
+class MarketsPage:
+    markets: List[Market]
+    next_cursor: str
+
+# Decoders map API payloads onto the typed records by precomputed field lists rather than keyword
+# expansion, so fields the API adds are ignored and missing ones default to None.
+MARKET_FIELDS = tuple(field.name for field in fields(Market))
+
+def decode_market(data: Dict) -> Market:
+    return Market(*map(data.get, MARKET_FIELDS))
+
+def decode_markets_page(raw: bytes) -> MarketsPage:
+    payload = json.loads(raw)
+    return MarketsPage([decode_market(market_data) for market_data in payload["data"]], payload["next_cursor"])
+
+def decode_levels(levels: Optional[List[Dict]]) -> List[Level]:
+    return [(parse_fixed(level["price"]), parse_fixed(level["size"])) for level in levels or []]
+
+def decode_book(data: Dict) -> OrderBook:
+    bids, asks = data.get("bids"), data.get("asks")
+    return OrderBook(data.get("asset_id"), data.get("market"), None, None, data.get("hash"), data.get("timestamp"),
+                     lambda: (decode_levels(bids), decode_levels(asks)))
+
+def decode_books(raw: bytes) -> List[OrderBook]:
+    return [decode_book(data) for data in json.loads(raw)]
+
+@dataclass(slots=True)
+class PriceChange:
+    asset_id: str
+    side: str  # "BUY" updates bids, "SELL" updates asks
+    price: int
+    size: int  # new aggregate size at price; 0 removes the level
+    hash: Optional[str]
+    timestamp: Optional[str]
+
+def decode_price_changes(event: Dict) -> List[PriceChange]:
+    # accepts both the per-asset "changes" layout and the batched "price_changes" layout of the market channel
+    if "price_changes" in event:
+        return [PriceChange(c["asset_id"], c["side"], parse_fixed(c["price"]), parse_fixed(c["size"]), c.get("hash"),
+                            event.get("timestamp")) for c in event["price_changes"]]
+    return [PriceChange(event["asset_id"], c["side"], parse_fixed(c["price"]), parse_fixed(c["size"]), event.get("hash"),
+                        event.get("timestamp")) for c in event.get("changes", [])]
+
+@dataclass
+class TopOfBook:
+    best_bid: Optional[int]
+    best_ask: Optional[int]
+    spread: Optional[int]
+    midpoint: Optional[float]
+
+class LocalBook:
+    # L2 book kept as ascending price lists plus size maps. Deltas are located with bisect, the best bid
+    # is the last bid price and the best ask the first ask price. After deltas the state is checked
+    # against the server's book hash (SHA-1 of the compact JSON summary with an empty hash field). If the
+    # first snapshot's own hash does not verify the book is marked unverifiable, so a change in how the
+    # server builds the hash cannot cause endless resyncs.
+    def __init__(self, snapshot: OrderBook):
+        self.verifiable: Optional[bool] = None
+        self.load(snapshot)
+
+    def load(self, snapshot: OrderBook):
+        self.asset_id = snapshot.asset_id
+        self.market = snapshot.market
+        self.bid_sizes: Dict[int, int] = dict(snapshot.bids)
+        self.ask_sizes: Dict[int, int] = dict(snapshot.asks)
+        self.bid_prices: List[int] = sorted(self.bid_sizes)
+        self.ask_prices: List[int] = sorted(self.ask_sizes)
+        self.hash = snapshot.hash
+        self.timestamp = snapshot.timestamp
+        if self.verifiable is None and snapshot.hash is not None:
+            self.verifiable = self.compute_hash() == snapshot.hash
+
+    def matches(self, snapshot: OrderBook) -> bool:
+        # same server state as held here, by hash or, for books without one, by timestamp
+        if snapshot.hash is not None:
+            return snapshot.hash == self.hash
+        return snapshot.timestamp is not None and snapshot.timestamp == self.timestamp
+
+    def apply(self, change: PriceChange):
+        prices, sizes = (self.bid_prices, self.bid_sizes) if change.side == "BUY" else (self.ask_prices, self.ask_sizes)
+        i = bisect.bisect_left(prices, change.price)
+        present = i < len(prices) and prices[i] == change.price
+        if change.size:
+            sizes[change.price] = change.size
+            if not present:
+                prices.insert(i, change.price)
+        elif present:
+            del prices[i]
+            del sizes[change.price]
+        self.hash = change.hash
+        self.timestamp = change.timestamp or self.timestamp
+
+    def apply_changes(self, changes: List[PriceChange]) -> bool:
+        # False when the resulting state no longer matches the server hash
+        for change in changes:
+            self.apply(change)
+        return self.in_sync()
+
+    def in_sync(self) -> bool:
+        if not self.verifiable or self.hash is None:
+            return True
+        return self.compute_hash() == self.hash
+
+    def compute_hash(self) -> str:
+        summary = {
+            "market": self.market,
+            "asset_id": self.asset_id,
+            "timestamp": self.timestamp,
+            "bids": [{"price": format_fixed(price), "size": format_fixed(self.bid_sizes[price])}
+                     for price in self.bid_prices],
+            "asks": [{"price": format_fixed(price), "size": format_fixed(self.ask_sizes[price])}
+                     for price in reversed(self.ask_prices)],
+            "hash": "",
+        }
+        return hashlib.sha1(json.dumps(summary, separators=(",", ":")).encode()).hexdigest()
+
+    @property
+    def best_bid(self) -> Optional[int]:
+        return self.bid_prices[-1] if self.bid_prices else None
+
+    @property
+    def best_ask(self) -> Optional[int]:
+        return self.ask_prices[0] if self.ask_prices else None
+
+    def top(self) -> TopOfBook:
+        best_bid, best_ask = self.best_bid, self.best_ask
+        if best_bid is None or best_ask is None:
+            return TopOfBook(best_bid, best_ask, None, None)
+        return TopOfBook(best_bid, best_ask, best_ask - best_bid, (best_bid + best_ask) / 2)
+
+class TokenRegistry:
+    # Maps each token id (a 70+ digit decimal string) to a dense int once. Per-token state lives in parallel
+    # lists indexed by that int, so the string is hashed once per incoming book instead of once per state
+    # dict, and array-backed state such as BatchChangeDetector can use the int as its index. Ids of released
+    # tokens are reused.
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.token_ids: List[Optional[str]] = []
+        self.books: List[Optional[LocalBook]] = []
+        self.baselines: List[Optional[TopOfBook]] = []  # top of book the next change is measured against
+        self.free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def id(self, token_id: str) -> int:
+        index = self.ids.get(token_id)
+        if index is None:
+            if self.free:
+                index = self.free.pop()
+                self.token_ids[index] = token_id
+            else:
+                index = len(self.token_ids)
+                self.token_ids.append(token_id)
+                self.books.append(None)
+                self.baselines.append(None)
+            self.ids[token_id] = index
+        return index
+
+    def book(self, token_id: str) -> Optional[LocalBook]:
+        index = self.ids.get(token_id)
+        return self.books[index] if index is not None else None
+
+    def release(self, token_id: str) -> Optional[int]:
+        index = self.ids.pop(token_id, None)
+        if index is not None:
+            self.token_ids[index] = self.books[index] = self.baselines[index] = None
+            self.free.append(index)
+        return index
+
+def decode_cursor(cursor: str) -> Optional[int]:
+    # /markets cursors are base64-encoded offsets; None if the format is not recognised
+    try:
+        return int(base64.b64decode(cursor, validate=True).decode())
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+def encode_cursor(offset: int) -> str:
+    return base64.b64encode(str(offset).encode()).decode()
+
+class Eip712AuthSigner:
+    # hashes for the constant parts of the Auth typed data are computed once; each signature
+    # only encodes the timestamp and nonce
+    DOMAIN_TYPE = b"EIP712Domain(string name,string version,uint256 chainId)"
+    AUTH_TYPE = b"Auth(string action,uint256 timestamp,uint256 nonce)"
+
+    def __init__(self, account, name: str = "Polymarket CLOB", version: str = "1", chain_id: int = 137):
+        self._sign_hash = getattr(account, "unsafe_sign_hash", None) or account.signHash
+        self.domain_separator = keccak(
+            keccak(self.DOMAIN_TYPE) + keccak(name.encode()) + keccak(version.encode()) + chain_id.to_bytes(32, "big")
+        )
+        self._struct_prefix = keccak(self.AUTH_TYPE) + keccak(b"Auth")
+        self._digest_prefix = b"\x19\x01" + self.domain_separator
+
+    def sign(self, timestamp: int, nonce: int = 0) -> str:
+        struct_hash = keccak(self._struct_prefix + timestamp.to_bytes(32, "big") + nonce.to_bytes(32, "big"))
+        return self._sign_hash(keccak(self._digest_prefix + struct_hash)).signature.hex()
+
+class AuthHeaderCache:
+    def __init__(self, sign: Callable[[], Dict[str, str]], validity: float = 30, refresh_margin: float = 5):
+        self.sign = sign
+        self.validity = validity  # seconds a signed header set is reused
+        self.refresh_margin = refresh_margin  # re-sign this many seconds before expiry
+        self.hits = 0
+        self.misses = 0
+        self._headers: Optional[Dict[str, str]] = None
+        self._expires_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.logger = logging.getLogger('PolymarketMonitor')
+
+    def get(self) -> Dict[str, str]:
+        if self._headers is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._headers
+        self.misses += 1
+        signed_at = time.monotonic()
+        self._store(self.sign(), signed_at)
+        return self._headers
+
+    def _store(self, headers: Dict[str, str], signed_at: float):
+        self._headers = headers
+        self._expires_at = signed_at + self.validity
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                signed_at = time.monotonic()
+                self._store(await asyncio.to_thread(self.sign), signed_at)
+            except Exception as e:
+                self.logger.error(f"Failed to refresh auth headers: {str(e)}", exc_info=True)
+            await asyncio.sleep(max(self.validity - self.refresh_margin, 1))
+
+class MarketCatalogStore:
+    schema = json.dumps({"fields": MARKET_FIELDS, "cold": COLD_FIELDS})
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS markets (condition_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS market_text (condition_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def load(self) -> Dict[str, Market]:
+        # Rows are JSON arrays in Market field order with COLD_FIELDS left null; their text lives in
+        # market_text and is read on demand by load_cold_fields. A cache with another schema is ignored.
+        if self._get_meta("schema") != self.schema:
+            return {}
+        rows = self.conn.execute("SELECT condition_id, data FROM markets")
+        return {condition_id: Market(*json.loads(data)) for condition_id, data in rows}
+
+    def save(self, markets: Iterable[Market]):
+        if self._get_meta("schema") != self.schema:
+            self.conn.execute("DELETE FROM markets")
+            self.conn.execute("DELETE FROM market_text")
+            self._set_meta("schema", self.schema)
+        rows, texts = [], []
+        for market in markets:
+            rows.append((market.condition_id, json.dumps(
+                [None if name in COLD_FIELDS else getattr(market, name) for name in MARKET_FIELDS])))
+            if market.description is not None:
+                texts.append((market.condition_id, json.dumps({name: getattr(market, name) for name in COLD_FIELDS})))
+        self.conn.executemany("INSERT OR REPLACE INTO markets (condition_id, data) VALUES (?, ?)", rows)
+        self.conn.executemany("INSERT OR REPLACE INTO market_text (condition_id, data) VALUES (?, ?)", texts)
+        self.conn.commit()
+
+    def load_cold_fields(self, condition_id: str) -> Dict[str, Optional[str]]:
+        row = self.conn.execute("SELECT data FROM market_text WHERE condition_id = ?", (condition_id,)).fetchone()
+        return json.loads(row[0]) if row else dict.fromkeys(COLD_FIELDS)
+
+    def delete(self, condition_ids: Iterable[str]):
+        params = [(c,) for c in condition_ids]
+        self.conn.executemany("DELETE FROM markets WHERE condition_id = ?", params)
+        self.conn.executemany("DELETE FROM market_text WHERE condition_id = ?", params)
+        self.conn.commit()
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def last_synced(self) -> Optional[float]:
+        value = self._get_meta("last_synced")
+        return float(value) if value is not None else None
+
+    def mark_synced(self, timestamp: Optional[float] = None):
+        self._set_meta("last_synced", str(timestamp if timestamp is not None else time.time()))
+        self.conn.commit()
+
+def monitored_tokens(market: Market) -> List[str]:
+    if not market.active or market.closed:
+        return []
+    return [token["token_id"] for token in market.tokens]
+
+def complement_sources(market: Market) -> Dict[str, str]:
+    # In a binary market the second outcome's book mirrors the first (NO bid = 1 - YES ask), so only
+    # the first outcome needs fetching. Markets with any other token count are fetched in full.
+    if len(market.tokens) != 2:
+        return {}
+    return {market.tokens[1]["token_id"]: market.tokens[0]["token_id"]}
+
+def complement_book(book: OrderBook, asset_id: str) -> OrderBook:
+    # carries the source hash so an unchanged source also marks its complement unchanged
+    one = FIXED_SCALE
+    return OrderBook(asset_id, book.market, None, None, book.hash, book.timestamp,
+                     lambda: ([(one - price, size) for price, size in book.asks],
+                              [(one - price, size) for price, size in book.bids]))
+
+def complement_top(top: TopOfBook) -> TopOfBook:
+    one = FIXED_SCALE
+    best_bid = one - top.best_ask if top.best_ask is not None else None
+    best_ask = one - top.best_bid if top.best_bid is not None else None
+    midpoint = one - top.midpoint if top.midpoint is not None else None
+    return TopOfBook(best_bid, best_ask, top.spread, midpoint)
+
+class MarketIndex:
+    # lookups over the catalog that are kept up to date as markets are added, changed or removed
+    def __init__(self):
+        self.monitored: Dict[str, str] = {}  # token_id -> condition_id for tokens the monitor polls
+        self.complements: Dict[str, str] = {}  # token_id -> token_id whose book it is inferred from
+        self.complement_of: Dict[str, str] = {}  # source token_id -> token_id inferred from it
+        self.token_to_condition: Dict[str, str] = {}
+        self.by_slug: Dict[str, str] = {}
+        self.by_category: Dict[str, Set[str]] = {}
+        self.by_end_date: Dict[str, Set[str]] = {}  # YYYY-MM-DD -> condition_ids
+        self.version = 0  # bumped on every change so consumers can tell when to re-read monitored
+
+    def add(self, market: Market):
+        self.version += 1
+        condition_id = market.condition_id
+        for token in market.tokens:
+            self.token_to_condition[token["token_id"]] = condition_id
+        for token_id in monitored_tokens(market):
+            self.monitored[token_id] = condition_id
+        for complement, source in complement_sources(market).items():
+            self.complements[complement] = source
+            self.complement_of[source] = complement
+        if market.market_slug:
+            self.by_slug[market.market_slug] = condition_id
+        self.by_category.setdefault(market.category, set()).add(condition_id)
+        if market.end_date_iso:
+            self.by_end_date.setdefault(market.end_date_iso[:10], set()).add(condition_id)
+
+    def remove(self, market: Market):
+        self.version += 1
+        condition_id = market.condition_id
+        for token in market.tokens:
+            self.token_to_condition.pop(token["token_id"], None)
+            self.monitored.pop(token["token_id"], None)
+            self.complements.pop(token["token_id"], None)
+            self.complement_of.pop(token["token_id"], None)
+        if self.by_slug.get(market.market_slug) == condition_id:
+            del self.by_slug[market.market_slug]
+        self._discard(self.by_category, market.category, condition_id)
+        if market.end_date_iso:
+            self._discard(self.by_end_date, market.end_date_iso[:10], condition_id)
+
+    def refresh(self, market: Market):
+        # re-evaluates monitored tokens after an in-place active/closed change
+        self.version += 1
+        for token in market.tokens:
+            self.monitored.pop(token["token_id"], None)
+        for token_id in monitored_tokens(market):
+            self.monitored[token_id] = market.condition_id
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, condition_id: str):
+        members = index.get(key)
+        if members is not None:
+            members.discard(condition_id)
+            if not members:
+                del index[key]
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def event_time(market: Market) -> Optional[float]:
+    # the moment activity peaks: kick-off for games, otherwise the market's end date
+    return parse_timestamp(market.game_start_time) or parse_timestamp(market.end_date_iso)
+
+@dataclass(slots=True)
+class PollState:
+    interval: float
+    next_due: float
+    event_time: Optional[float]
+    last_mid: Optional[float] = None
+    volatility: float = 0.0  # EWMA of relative midpoint moves between polls
+    last_alert: float = 0.0
+
+class AdaptivePollScheduler:
+    # Min-heap of (next_due, token_id). Each token's interval shrinks from max_interval towards
+    # min_interval with book volatility, nearness to its event and recent alerts. At most budget
+    # tokens are handed out per call to due(). Inferred complements are not scheduled themselves:
+    # they follow their source token, so both stay in phase and the complement is never fetched.
+    LIVE_WINDOW = 3 * 3600  # seconds after a game starts during which it is polled at min_interval
+    ALERT_WINDOW = 600  # seconds after an alert during which a token stays on a short interval
+
+    def __init__(self, min_interval: float = 5, max_interval: float = 300, budget: int = 1000,
+                 volatility_ref: float = 0.01):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.budget = budget
+        self.volatility_ref = volatility_ref  # relative move per poll that halves the interval
+        self.states: Dict[str, PollState] = {}
+        self.heap: List[Tuple[float, str]] = []
+        self.sources: Dict[str, str] = {}  # complement -> source token it is polled with
+        self._index_version = -1
+
+    def sync(self, index: MarketIndex, markets: Dict[str, Market], complements: Optional[Dict[str, str]] = None):
+        if index.version == self._index_version:
+            return
+        now = time.monotonic()
+        self.sources = {complement: source for complement, source in (complements or {}).items()
+                        if complement in index.monitored and source in index.monitored}
+        for token_id, condition_id in index.monitored.items():
+            if token_id not in self.states and token_id not in self.sources:
+                self.states[token_id] = PollState(self.max_interval, now, event_time(markets[condition_id]))
+                heapq.heappush(self.heap, (now, token_id))
+        for token_id in [token_id for token_id in self.states
+                         if token_id not in index.monitored or token_id in self.sources]:
+            del self.states[token_id]
+        self._index_version = index.version
+
+    def due(self, now: float) -> List[str]:
+        tokens = []
+        while self.heap and self.heap[0][0] <= now and len(tokens) < self.budget:
+            next_due, token_id = heapq.heappop(self.heap)
+            state = self.states.get(token_id)
+            if state is None or state.next_due != next_due:
+                continue  # superseded entry
+            # provisional slot so a token whose check fails is still polled again
+            self._push(token_id, state, now + state.interval)
+            tokens.append(token_id)
+        return tokens
+
+    def observe(self, token_id: str, midpoint: Optional[float], alerted: bool):
+        source = self.sources.get(token_id)
+        if source is not None:
+            # a complement only shortens its source's interval through alerts
+            state = self.states.get(source)
+            if alerted and state is not None:
+                state.last_alert = time.time()
+            return
+        state = self.states.get(token_id)
+        if state is None:
+            return
+        if midpoint is not None and state.last_mid:
+            move = abs((midpoint - state.last_mid) / state.last_mid)
+            state.volatility = 0.7 * state.volatility + 0.3 * move
+        if midpoint is not None:
+            state.last_mid = midpoint
+        if alerted:
+            state.last_alert = time.time()
+        state.interval = self.interval_for(state)
+        self._push(token_id, state, time.monotonic() + state.interval)
+
+    def interval_for(self, state: PollState) -> float:
+        now = time.time()
+        interval = self.max_interval / (1 + state.volatility / self.volatility_ref)
+        if state.event_time is not None:
+            until = state.event_time - now
+            if until > 0:
+                interval = min(interval, until / 20)
+            elif until > -self.LIVE_WINDOW:
+                interval = self.min_interval
+        if now - state.last_alert < self.ALERT_WINDOW:
+            interval = min(interval, 2 * self.min_interval)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _push(self, token_id: str, state: PollState, next_due: float):
+        state.next_due = next_due
+        heapq.heappush(self.heap, (next_due, token_id))
+
+OVERRUN_SKIP = "skip"  # drop the ticks a late cycle missed and wait for the next slot on the grid
+OVERRUN_COMPRESS = "compress"  # start the next cycle straight away to catch up, dropping ticks only beyond one period
+
+class CycleScheduler:
+    # runs a cycle on a fixed grid of start times (start + k * period), so scan time does not add to the period.
+    # A cycle returning False did no work; its timing line is logged at debug level only.
+    def __init__(self, period: float = 60, overrun_policy: str = OVERRUN_SKIP):
+        if overrun_policy not in (OVERRUN_SKIP, OVERRUN_COMPRESS):
+            raise ValueError(f"Unknown overrun policy: {overrun_policy}")
+        self.period = period
+        self.overrun_policy = overrun_policy
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.lag = 0.0  # seconds the last cycle started after its slot
+        self.achieved_period: Optional[float] = None  # seconds between the last two cycle starts
+        self.last_duration = 0.0
+        self.logger = logging.getLogger('PolymarketMonitor')
+
+    async def run(self, cycle: Callable[[], Awaitable], first_due: Optional[float] = None):
+        next_due = first_due if first_due is not None else time.monotonic()
+        last_start = None
+        while True:
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = time.monotonic()
+            self.lag = start - next_due
+            if last_start is not None:
+                self.achieved_period = start - last_start
+            last_start = start
+            worked = True
+            try:
+                worked = await cycle() is not False
+            except Exception as e:
+                self.logger.error(f"An error occurred: {str(e)}", exc_info=True)
+            self.cycles += 1
+            self.last_duration = time.monotonic() - start
+            next_due += self.period
+            behind = time.monotonic() - next_due
+            if behind > 0:
+                self.overruns += 1
+                if self.overrun_policy == OVERRUN_SKIP:
+                    missed = int(behind // self.period) + 1
+                elif behind > self.period:
+                    missed = int(behind // self.period)
+                else:
+                    missed = 0
+                self.skipped += missed
+                next_due += missed * self.period
+            period = f"{self.achieved_period:.2f}s" if self.achieved_period is not None else "n/a"
+            log = self.logger.info if worked else self.logger.debug
+            log(f"Cycle {self.cycles} took {self.last_duration:.2f}s (lag {self.lag:.2f}s, period {period}, "
+                f"{self.overruns} overruns, {self.skipped} skipped)")
+
+PRICE_CHANGE_THRESHOLD = 15  # percent move in the best bid or ask that raises an alert
+SPREAD_CHANGE_THRESHOLD = 50  # percent change in the spread that raises an alert
+
+class BatchChangeDetector:
+    # Per-token best bid, best ask and spread in contiguous arrays indexed by TokenRegistry ids. detect()
+    # compares the whole universe against the previous cycle's baseline in a few vectorized operations with
+    # the same integer thresholds as the per-token diff. Missing prices are stored as 0, as in that diff.
+    def __init__(self, capacity: int = 1024):
+        self.size = 0  # one past the highest id seen
+        self.current = np.zeros((3, capacity), dtype=np.int64)  # rows: best bid, best ask, spread
+        self.baseline = np.zeros((3, capacity), dtype=np.int64)
+        self.has_spread = np.zeros(capacity, dtype=bool)  # current spread known (both sides quoted)
+        self.present = np.zeros(capacity, dtype=bool)
+        self.has_baseline = np.zeros(capacity, dtype=bool)
+
+    def _grow(self, capacity: int):
+        for name in ("current", "baseline", "has_spread", "present", "has_baseline"):
+            old = getattr(self, name)
+            new = np.zeros(old.shape[:-1] + (capacity,), dtype=old.dtype)
+            new[..., :old.shape[-1]] = old
+            setattr(self, name, new)
+
+    def update(self, slot: int, top: TopOfBook):
+        if slot >= self.present.shape[0]:
+            self._grow(max(2 * self.present.shape[0], slot + 1))
+        self.size = max(self.size, slot + 1)
+        self.current[0, slot] = top.best_bid or 0
+        self.current[1, slot] = top.best_ask or 0
+        self.current[2, slot] = top.spread or 0
+        self.has_spread[slot] = top.spread is not None
+        self.present[slot] = True
+
+    def remove(self, slot: int):
+        if slot < self.size:
+            self.present[slot] = self.has_baseline[slot] = False
+
+    def detect(self) -> List[Tuple[int, Dict, Optional[float]]]:
+        # (slot, price_changes, spread_change) for every token past a threshold since the baseline
+        n = self.size
+        bid, ask, spread = self.current[:, :n]
+        prev_bid, prev_ask, prev_spread = self.baseline[:, :n]
+        compared = self.has_baseline[:n] & self.present[:n]
+        bid_hit = compared & (prev_bid != 0) & (np.abs(bid - prev_bid) * 100 >= PRICE_CHANGE_THRESHOLD * prev_bid)
+        ask_hit = compared & (prev_ask != 0) & (np.abs(ask - prev_ask) * 100 >= PRICE_CHANGE_THRESHOLD * prev_ask)
+        spread_hit = (compared & self.has_spread[:n] & (prev_spread != 0)
+                      & (np.abs(spread - prev_spread) * 100 >= SPREAD_CHANGE_THRESHOLD * np.abs(prev_spread)))
+        triggered = np.flatnonzero(bid_hit | ask_hit | spread_hit)
+        if not triggered.size:
+            return []
+
+        # percentages only for the triggered slots
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bid_pct = (bid[triggered] - prev_bid[triggered]) * 100 / prev_bid[triggered]
+            ask_pct = (ask[triggered] - prev_ask[triggered]) * 100 / prev_ask[triggered]
+            spread_pct = (spread[triggered] - prev_spread[triggered]) * 100 / prev_spread[triggered]
+        results = []
+        for k, slot in enumerate(triggered.tolist()):
+            price_changes = {}
+            if bid_hit[slot]:
+                price_changes["bids"] = float(bid_pct[k])
+            if ask_hit[slot]:
+                price_changes["asks"] = float(ask_pct[k])
+            results.append((slot, price_changes, float(spread_pct[k]) if spread_hit[slot] else None))
+        return results
+
+    def roll(self):
+        # the current values become the baseline for the next cycle
+        n = self.size
+        self.baseline[:, :n] = self.current[:, :n]
+        self.has_baseline[:n] = self.present[:n]
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    # Allows rate requests per second with bursts up to burst. A 429 pauses the bucket for Retry-After
+    # (or an exponential backoff) and halves its rate; successes restore the rate additively.
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.configured_rate = rate
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.wait_time = 0.0  # total seconds callers spent waiting for this bucket
+        self.throttled = 0  # 429 responses seen
+        self._consecutive_throttles = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        start = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+        self.wait_time += time.monotonic() - start
+
+    def throttle(self, retry_after: Optional[float]):
+        self.throttled += 1
+        self._consecutive_throttles += 1
+        self.rate = max(self.rate / 2, self.configured_rate / 16)
+        delay = retry_after if retry_after is not None else min(2 ** self._consecutive_throttles, 60)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        self.tokens = 0
+
+    def succeed(self):
+        self._consecutive_throttles = 0
+        if self.rate < self.configured_rate:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate / 20)
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and rejects calls for reset_timeout seconds,
+    # then lets a single trial call through (half-open). Its outcome closes or re-opens the circuit.
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trips = 0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            if self.opened_at is None or self._trial_in_flight:
+                self.trips += 1
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release(self):
+        # the call ended without telling us anything about the endpoint's health (e.g. cancelled)
+        self._trial_in_flight = False
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+@dataclass
+class StreamShard:
+    assets: List[str]
+    task: Optional[asyncio.Task] = None
+
+class MarketStream:
+    # Subscribes to the CLOB market channel in shards of shard_size assets, one WebSocket per shard.
+    # Each shard sends PING every ping_interval and reconnects with jittered backoff when the socket
+    # closes or goes silent; the server resends book snapshots on resubscription.
+    def __init__(self, session: aiohttp.ClientSession, url: str, on_book: Callable[[OrderBook], Awaitable],
+                 on_price_change: Callable[[List[PriceChange]], Awaitable], shard_size: int = WS_SHARD_SIZE,
+                 ping_interval: float = 10, max_backoff: float = 30):
+        self.session = session
+        self.url = url
+        self.on_book = on_book
+        self.on_price_change = on_price_change
+        self.shard_size = shard_size
+        self.ping_interval = ping_interval
+        self.max_backoff = max_backoff
+        self.subscribed: Set[str] = set()
+        self.shards: List[StreamShard] = []
+        self.messages = 0
+        self.reconnects = 0
+        self.logger = logging.getLogger('PolymarketMonitor')
+
+    def set_assets(self, token_ids: Iterable[str]):
+        # Makes token_ids the whole subscription. Assets that left are dropped from their shards and new ones
+        # fill shards with room before new shards open; only shards whose membership changed reconnect.
+        # When removals leave more than one shard beyond the minimum, all shards are re-packed.
+        wanted = list(dict.fromkeys(token_ids))
+        keep = set(wanted)
+        changed = []
+        for shard in self.shards:
+            assets = [asset for asset in shard.assets if asset in keep]
+            if len(assets) != len(shard.assets):
+                shard.assets = assets
+                changed.append(shard)
+        new = [asset for asset in wanted if asset not in self.subscribed]
+        self.subscribed = keep
+
+        minimum = -(-len(wanted) // self.shard_size)
+        if len([shard for shard in self.shards if shard.assets]) > minimum + 1:
+            for shard in self.shards:
+                shard.task.cancel()
+            self.shards = [StreamShard(wanted[i:i + self.shard_size]) for i in range(0, len(wanted), self.shard_size)]
+            changed = list(self.shards)
+        else:
+            for shard in self.shards:
+                if new and len(shard.assets) < self.shard_size:
+                    room = self.shard_size - len(shard.assets)
+                    shard.assets, new = shard.assets + new[:room], new[room:]
+                    if shard not in changed:
+                        changed.append(shard)
+            for i in range(0, len(new), self.shard_size):
+                self.shards.append(StreamShard(new[i:i + self.shard_size]))
+                changed.append(self.shards[-1])
+
+        for shard in changed:
+            if shard.task is not None:
+                shard.task.cancel()
+            shard.task = asyncio.create_task(self._run_shard(shard)) if shard.assets else None
+        self.shards = [shard for shard in self.shards if shard.assets]
+
+    async def close(self):
+        tasks = [shard.task for shard in self.shards if shard.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.shards = []
+
+    async def _run_shard(self, shard: StreamShard):
+        assets = shard.assets
+        backoff = 1.0
+        while True:
+            try:
+                async with self.session.ws_connect(self.url) as ws:
+                    await ws.send_json({"assets_ids": assets, "type": "market"})
+                    backoff = 1.0
+                    await self._read(ws)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                self.logger.warning(f"Market stream ({len(assets)} assets) disconnected: {e!r}")
+            except Exception as e:  # never let a shard die; anything unexpected goes through the reconnect path
+                self.logger.error(f"Market stream ({len(assets)} assets) failed: {e!r}", exc_info=True)
+            self.reconnects += 1
+            await asyncio.sleep(random.uniform(0.5, 1) * backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def _read(self, ws: aiohttp.ClientWebSocketResponse):
+        last_seen = last_ping = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - last_seen > 3 * self.ping_interval:
+                self.logger.warning("Market stream heartbeat lost, reconnecting")
+                await ws.close()
+                return
+            if now - last_ping >= self.ping_interval:
+                await ws.send_str("PING")
+                last_ping = now
+            try:
+                msg = await ws.receive(timeout=max(last_ping + self.ping_interval - time.monotonic(), 0.01))
+            except asyncio.TimeoutError:
+                continue
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                last_seen = time.monotonic()
+                if msg.data != "PONG":
+                    await self._dispatch(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED,
+                              aiohttp.WSMsgType.ERROR):
+                return
+
+    async def _dispatch(self, raw: str):
+        try:
+            payload = json.loads(raw)
+        except ValueError:
+            self.logger.warning(f"Ignoring non-JSON market stream frame: {raw[:200]!r}")
+            return
+        for event in payload if isinstance(payload, list) else [payload]:
+            self.messages += 1
+            try:
+                event_type = event.get("event_type")
+                if event_type == "book":
+                    if "bids" not in event:
+                        event = {**event, "bids": event.get("buys"), "asks": event.get("sells")}
+                    await self.on_book(decode_book(event))
+                elif event_type == "price_change":
+                    await self.on_price_change(decode_price_changes(event))
+            except Exception as e:
+                self.logger.error(f"Failed to handle market stream event: {str(e)}", exc_info=True)
+
 class PolymarketClient:
-    def __init__(self, private_key: str, polygon_rpc_url: str):
+    def __init__(self, private_key: str, polygon_rpc_url: str, auth_validity: float = 30,
+                 credentials_path: Optional[str] = None, rate_limits: Optional[Dict[str, float]] = None,
+                 request_timeout: float = 10, max_retries: int = 3, backoff_base: float = 0.25, backoff_max: float = 5,
+                 hedge_after: Optional[float] = None, breaker_threshold: int = 5, breaker_reset: float = 30):
         self.w3 = Web3(Web3.HTTPProvider(polygon_rpc_url))
         self.account = Account.from_key(private_key)
         self.address = self.account.address
+        self.signer = Eip712AuthSigner(self.account)
         self.base_url = "https://clob.polymarket.com"
-        self.session = aiohttp.ClientSession()
+        self.ws_url = WS_MARKET_URL
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=request_timeout))
+        self.auth_cache = AuthHeaderCache(self._get_auth_headers, validity=auth_validity)
+        self.credentials: Optional[ApiCredentials] = None
+        self.credentials_path = credentials_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'clob_creds.json')
+        self.rate_limits = {**RATE_LIMITS, **(rate_limits or {})}
+        self.limiters: Dict[str, TokenBucket] = {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base  # seconds; full jitter over base * 2 ** attempt, capped at backoff_max
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after  # seconds before a duplicate of a slow public read is sent; None disables
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.hedges = 0
+        self.logger = logging.getLogger('PolymarketMonitor')
 
     async def close(self):
+        await self.auth_cache.stop()
         await self.session.close()
 
     def _get_auth_headers(self):
         timestamp = int(time.time() * 1000)
         nonce = 0  # Implement nonce management if required
 
-        domain = {
-            "name": "Polymarket CLOB",
-            "version": "1",
-            "chainId": 137,
-        }
-        message = {
-            "action": "Auth",
-            "timestamp": timestamp,
-            "nonce": nonce
-        }
-        data = {
-            "types": {
-                "EIP712Domain": [
-                    {"name": "name", "type": "string"},
-                    {"name": "version", "type": "string"},
-                    {"name": "chainId", "type": "uint256"},
-                ],
-                "Auth": [
-                    {"name": "action", "type": "string"},
-                    {"name": "timestamp", "type": "uint256"},
-                    {"name": "nonce", "type": "uint256"},
-                ],
-            },
-            "domain": domain,
-            "primaryType": "Auth",
-            "message": message,
+        return {
+            "POLY-ADDRESS": self.address,
+            "POLY-SIGNATURE": self.signer.sign(timestamp, nonce),
+            "POLY-TIMESTAMP": str(timestamp),
+            "POLY-NONCE": str(nonce),
         }
 
-        signed_message = self.account.sign_message(encode_typed_data(data))
-
+    def _get_l2_headers(self, method: str, path: str, body: str = "") -> Dict[str, str]:
+        timestamp = int(time.time())
+        message = f"{timestamp}{method}{path}{body}"
+        digest = hmac.new(base64.urlsafe_b64decode(self.credentials.secret), message.encode(), hashlib.sha256).digest()
         return {
             "POLY-ADDRESS": self.address,
-            "POLY-SIGNATURE": signed_message.signature.hex(),
+            "POLY-SIGNATURE": base64.urlsafe_b64encode(digest).decode(),
             "POLY-TIMESTAMP": str(timestamp),
-            "POLY-NONCE": str(nonce),
+            "POLY-API-KEY": self.credentials.api_key,
+            "POLY-PASSPHRASE": self.credentials.passphrase,
         }
 
-    async def get_markets(self, next_cursor: str = "") -> Dict:
-        url = f"{self.base_url}/markets"
-        params = {"next_cursor": next_cursor}
-        async with self.session.get(url, params=params, headers=self._get_auth_headers()) as response:
-            return await response.json()
+    def _headers(self, endpoint: str, method: str = "GET", path: Optional[str] = None, body: str = "") -> Dict[str, str]:
+        policy = ENDPOINT_AUTH.get(endpoint, AUTH_L2)
+        if policy == AUTH_PUBLIC:
+            return {}
+        if policy == AUTH_L2 and self.credentials is not None:
+            return self._get_l2_headers(method, path or endpoint, body)
+        # the first signed request starts the background refresher
+        self.auth_cache.start()
+        return self.auth_cache.get()
+
+    def load_api_credentials(self) -> Optional[ApiCredentials]:
+        if not os.path.exists(self.credentials_path):
+            return None
+        with open(self.credentials_path) as f:
+            return ApiCredentials(**json.load(f))
+
+    def save_api_credentials(self, credentials: ApiCredentials):
+        fd = os.open(self.credentials_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(asdict(credentials), f)
+
+    def limiter(self, endpoint: str) -> TokenBucket:
+        bucket = self.limiters.get(endpoint)
+        if bucket is None:
+            rate = self.rate_limits.get(endpoint, DEFAULT_RATE_LIMIT)
+            bucket = self.limiters[endpoint] = TokenBucket(rate / 2, rate * RATE_LIMIT_WINDOW / 2)
+        return bucket
+
+    def limiter_stats(self) -> Dict[str, Dict[str, float]]:
+        return {endpoint: {"wait_time": bucket.wait_time, "throttled": bucket.throttled, "rate": bucket.rate}
+                for endpoint, bucket in self.limiters.items()}
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    async def _request(self, method: str, endpoint: str, path: Optional[str] = None, params: Optional[Dict] = None,
+                       json_body=None) -> bytes:
+        # endpoint is the policy key (e.g. "/markets/{condition_id}"), path the concrete request path.
+        # Transient failures are retried with jittered exponential backoff behind the endpoint's breaker.
+        path = path or endpoint
+        body = json.dumps(json_body) if json_body is not None else ""
+        breaker = self.breaker(endpoint)
+        hedge = self.hedge_after is not None and ENDPOINT_AUTH.get(endpoint) == AUTH_PUBLIC
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {endpoint}")
+            try:
+                if hedge:
+                    result = await self._send_hedged(method, endpoint, path, params, body)
+                else:
+                    result = await self._send(method, endpoint, path, params, body)
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.record_success()  # the endpoint answered; the request itself was bad
+                    raise
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                continue
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+    async def _send_hedged(self, method: str, endpoint: str, path: str, params: Optional[Dict], body: str) -> bytes:
+        # a second copy is sent if the first has not answered after hedge_after; the first success wins
+        tasks = [asyncio.ensure_future(self._send(method, endpoint, path, params, body))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(self._send(method, endpoint, path, params, body)))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                if not pending:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _send(self, method: str, endpoint: str, path: str, params: Optional[Dict], body: str) -> bytes:
+        bucket = self.limiter(endpoint)
+        for attempt in range(MAX_THROTTLE_RETRIES + 1):
+            await bucket.acquire()
+            headers = self._headers(endpoint, method, path, body)
+            if body:
+                headers = {**headers, "Content-Type": "application/json"}
+            async with self.session.request(method, f"{self.base_url}{path}", params=params, data=body or None,
+                                            headers=headers) as response:
+                if response.status == 429 and attempt < MAX_THROTTLE_RETRIES:
+                    bucket.throttle(parse_retry_after(response.headers.get("Retry-After")))
+                    continue
+                response.raise_for_status()
+                bucket.succeed()
+                return await response.read()
+
+    async def derive_api_key(self) -> ApiCredentials:
+        data = json.loads(await self._request("GET", "/auth/derive-api-key"))
+        return ApiCredentials(data["apiKey"], data["secret"], data["passphrase"])
+
+    async def create_api_key(self) -> ApiCredentials:
+        data = json.loads(await self._request("POST", "/auth/api-key"))
+        return ApiCredentials(data["apiKey"], data["secret"], data["passphrase"])
+
+    async def get_api_keys(self) -> List[str]:
+        return json.loads(await self._request("GET", "/auth/api-keys"))["apiKeys"]
+
+    async def init_api_credentials(self) -> ApiCredentials:
+        # L1-sign once to obtain API credentials, then every private request uses L2 HMAC headers
+        self.credentials = self.load_api_credentials()
+        if self.credentials is not None:
+            try:
+                await self.get_api_keys()
+            except aiohttp.ClientResponseError as e:
+                if e.status != 401:
+                    raise
+                self.logger.warning("Stored API credentials were rejected, deriving new ones")
+                self.credentials = None
+        if self.credentials is None:
+            try:
+                credentials = await self.derive_api_key()
+            except aiohttp.ClientResponseError as e:
+                # only a client error means there is no key to derive; a 429 or 5xx must not mint another key
+                if e.status == 429 or not 400 <= e.status < 500:
+                    raise
+                credentials = await self.create_api_key()
+            self.save_api_credentials(credentials)
+            self.credentials = credentials
+        # no endpoint reads L1 headers once L2 credentials are set; _headers() restarts this if one does
+        await self.auth_cache.stop()
+        return self.credentials
+
+    async def get_markets(self, next_cursor: str = "") -> MarketsPage:
+        return decode_markets_page(await self._request("GET", "/markets", params={"next_cursor": next_cursor}))
+
+    async def iter_market_pages(self, fan_out: int = 8) -> AsyncIterator[MarketsPage]:
+        # The first page gives the page size; later cursors are predicted and fetched fan_out at a
+        # time. Pages are yielded in catalog order. If a returned cursor does not match the prediction,
+        # the rest of the walk follows next_cursor sequentially.
+        page = await self.get_markets("")
+        yield page
+        cursor = page.next_cursor
+        page_size = len(page.markets)
+        offset = decode_cursor(cursor) if page_size else None
+        while cursor != END_CURSOR:
+            if offset is None:
+                page = await self.get_markets(cursor)
+                yield page
+                cursor = page.next_cursor
+                continue
+            cursors = [encode_cursor(offset + i * page_size) for i in range(fan_out)]
+            # pages past the end of the catalog may fail; only an error before the last page is raised
+            pages = await asyncio.gather(*(self.get_markets(c) for c in cursors), return_exceptions=True)
+            for predicted, page in zip(cursors, pages):
+                if isinstance(page, BaseException):
+                    raise page
+                yield page
+                cursor = page.next_cursor
+                if cursor == END_CURSOR:
+                    return
+                if cursor != encode_cursor(decode_cursor(predicted) + page_size):
+                    offset = None
+                    break
+            else:
+                offset = decode_cursor(cursor)
 
     async def get_market(self, condition_id: str) -> Market:
-        url = f"{self.base_url}/markets/{condition_id}"
-        async with self.session.get(url, headers=self._get_auth_headers()) as response:
-            data = await response.json()
-            return Market(**data["market"])
-
-    async def get_order_book(self, token_id: str) -> Dict:
-        url = f"{self.base_url}/book"
-        params = {"token_id": token_id}
-        async with self.session.get(url, params=params, headers=self._get_auth_headers()) as response:
-            return await response.json()
-
-    async def get_spread(self, token_id: str) -> Decimal:
-        url = f"{self.base_url}/spread"
-        params = {"token_id": token_id}
-        async with self.session.get(url, params=params, headers=self._get_auth_headers()) as response:
-            data = await response.json()
-            return Decimal(data["spread"])
+        data = json.loads(await self._request("GET", "/markets/{condition_id}", f"/markets/{condition_id}"))
+        return decode_market(data["market"])
+
+    async def get_order_book(self, token_id: str) -> OrderBook:
+        return decode_book(json.loads(await self._request("GET", "/book", params={"token_id": token_id})))
+
+    async def get_order_books(self, params: List[BookParams]) -> Dict[str, OrderBook]:
+        # Chunks are fetched concurrently. Tokens in a chunk that still fails after retries are left
+        # out of the result; the error is raised only if every chunk failed.
+        bodies = [[{"token_id": p.token_id, **({"side": p.side} if p.side else {})} for p in params[i:i + BOOKS_BATCH_SIZE]]
+                  for i in range(0, len(params), BOOKS_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._request("POST", "/books", json_body=body) for body in bodies),
+                                       return_exceptions=True)
+        books = {}
+        errors = [result for result in results if isinstance(result, BaseException)]
+        for result in results:
+            if not isinstance(result, BaseException):
+                for book in decode_books(result):
+                    books[book.asset_id] = book
+        if errors:
+            if len(errors) == len(results):
+                raise errors[0]
+            self.logger.warning(f"{len(errors)} of {len(results)} /books chunks failed: {errors[0]!r}")
+        return books
+
+    def stream_market(self, on_book: Callable[[OrderBook], Awaitable],
+                      on_price_change: Callable[[List[PriceChange]], Awaitable], shard_size: int = WS_SHARD_SIZE) -> MarketStream:
+        return MarketStream(self.session, self.ws_url, on_book, on_price_change, shard_size)
+
+    async def get_spread(self, token_id: str) -> int:
+        data = json.loads(await self._request("GET", "/spread", params={"token_id": token_id}))
+        return parse_fixed(data["spread"])
 
 class OrderbookMonitor:
-    def __init__(self, private_key: str, polygon_rpc_url: str, telegram_bot_token: str, telegram_chat_id: str):
+    def __init__(self, private_key: str, polygon_rpc_url: str, telegram_bot_token: str, telegram_chat_id: str,
+                 cross_check_spread: bool = False, max_concurrency: int = 50, check_timeout: float = 10,
+                 catalog_fan_out: int = 8, catalog_path: Optional[str] = None, resync_interval: float = 900,
+                 infer_complements: bool = True, cycle_period: float = 60, overrun_policy: str = OVERRUN_SKIP,
+                 poll_scheduler: Optional[AdaptivePollScheduler] = None, streaming: bool = False,
+                 batch_detection: bool = False):
         self.client = PolymarketClient(private_key, polygon_rpc_url)
+        self.cross_check_spread = cross_check_spread  # also query /spread and compare against the book
+        self.max_concurrency = max_concurrency
+        self.check_timeout = check_timeout  # seconds per check_market call
+        self.catalog_fan_out = catalog_fan_out  # /markets pages fetched concurrently at startup
+        self.catalog = MarketCatalogStore(catalog_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'markets.db'))
+        self.catalog_sync: Optional[asyncio.Task] = None
+        self.resync_interval = resync_interval  # seconds between incremental catalog re-syncs
+        self.infer_complements = infer_complements  # derive the second outcome's book in binary markets
+        # with a poll scheduler each cycle is a tick that polls only the tokens due, not the whole universe,
+        # and ticks come every min_interval so short intervals are actually honoured
+        self.poll_scheduler = poll_scheduler
+        if poll_scheduler is not None and not streaming:
+            cycle_period = min(cycle_period, poll_scheduler.min_interval)
+        self.scheduler = CycleScheduler(cycle_period, overrun_policy)
+        # in streaming mode books arrive over the market WebSocket and each cycle only rolls the alert baselines
+        self.streaming = streaming
+        self.stream: Optional[MarketStream] = None
+        self._subscribed_version = -1
+        # with batch detection polled cycles are diffed in one vectorized pass instead of per-token checks
+        self.detector = BatchChangeDetector() if batch_detection else None
         self.telegram_bot = Bot(telegram_bot_token)
         self.telegram_chat_id = telegram_chat_id
         self.markets: Dict[str, Market] = {}
-        self.previous_books: Dict[str, Dict] = {}
-        self.previous_spreads: Dict[str, Decimal] = {}
+        self.index = MarketIndex()
+        self.tokens = TokenRegistry()  # local book and alert baseline per token
+        self.book_resyncs = 0
+        self.stale: Set[str] = set()  # streamed tokens whose book diverged and awaits a REST snapshot
+        self.resyncs: Dict[str, asyncio.Task] = {}
+        self.books_checked = 0
+        self.books_skipped = 0  # snapshots identical to the held book, not re-diffed
         self.setup_logging()
 
     def setup_logging(self):
@@ -146,72 +1345,374 @@ class OrderbookMonitor:
         file_handler.setFormatter(file_formatter)
         self.logger.addHandler(file_handler)
 
-    async def initialize_markets(self):
-        self.logger.info("Initializing markets...")
-        next_cursor = ""
-        while True:
-            markets_data = await self.client.get_markets(next_cursor)
-            for market_data in markets_data["data"]:
-                market = Market(**market_data)
+    async def stream_markets(self) -> AsyncIterator[List[Market]]:
+        async for page in self.client.iter_market_pages(self.catalog_fan_out):
+            yield page.markets
+
+    def apply_catalog_page(self, page: List[Market]) -> List[Market]:
+        # merges a page of remote markets into self.markets and returns the markets that were added or changed
+        changed = []
+        for market in page:
+            local = self.markets.get(market.condition_id)
+            if local is None:
                 self.markets[market.condition_id] = market
+                self.index.add(market)
                 self.logger.debug(f"Added market: {market.description}")
-            next_cursor = markets_data["next_cursor"]
-            if next_cursor == "LTE=":
-                break
-        self.logger.info(f"Initialized {len(self.markets)} markets")
+                changed.append(market)
+            elif local.active != market.active or local.closed != market.closed:
+                local.active = market.active
+                local.closed = market.closed
+                self.index.refresh(local)
+                if not local.active or local.closed:
+                    self.forget_tokens(local)
+                changed.append(local)
+        return changed
 
-    async def monitor_markets(self):
-        await self.initialize_markets()
-        self.logger.info("Starting market monitoring...")
+    def forget_tokens(self, market: Market):
+        for token in market.tokens:
+            self.release_token(token["token_id"])
+
+    def release_token(self, token_id: str):
+        index = self.tokens.release(token_id)
+        if index is not None and self.detector is not None:
+            self.detector.remove(index)
+
+    def load_cached_catalog(self) -> bool:
+        start = time.monotonic()
+        for market in self.catalog.load().values():
+            self.markets[market.condition_id] = market
+            self.index.add(market)
+        if not self.markets:
+            return False
+        self.logger.info(f"Loaded {len(self.markets)} cached markets in {(time.monotonic() - start) * 1000:.0f}ms "
+                         f"(last synced {time.ctime(self.catalog.last_synced or 0)})")
+        return True
+
+    async def sync_catalog(self, queue: Optional[asyncio.Queue] = None):
+        # Diffs the remote catalog against self.markets page by page, persisting only adds, removes and
+        # active/closed changes. Each page is passed to queue (if given) as it arrives; None marks the end.
+        self.logger.info("Syncing markets...")
+        try:
+            seen = set()
+            added = updated = 0
+            async for page in self.stream_markets():
+                known = len(self.markets)
+                changed = self.apply_catalog_page(page)
+                added += len(self.markets) - known
+                updated += len(changed) - (len(self.markets) - known)
+                self.catalog.save(changed)
+                for market in changed:
+                    market.drop_cold_fields()
+                seen.update(market.condition_id for market in page)
+                if queue is not None:
+                    await queue.put([self.markets[market.condition_id] for market in page])
+            removed = [condition_id for condition_id in self.markets if condition_id not in seen]
+            for condition_id in removed:
+                market = self.markets.pop(condition_id)
+                self.index.remove(market)
+                self.forget_tokens(market)
+            self.catalog.delete(removed)
+            self.catalog.mark_synced()
+            self.logger.info(f"Synced {len(self.markets)} markets "
+                             f"({added} added, {len(removed)} removed, {updated} updated)")
+        finally:
+            if queue is not None:
+                await queue.put(None)
+
+    async def catalog_sync_loop(self, delay: float):
         while True:
+            await asyncio.sleep(delay)
             try:
-                for condition_id, market in self.markets.items():
-                    if market.active and not market.closed:
-                        token_id = market.tokens[0]["token_id"]
-                        await self.check_market(condition_id, token_id)
-                await asyncio.sleep(60)
+                await self.sync_catalog()
             except Exception as e:
-                self.logger.error(f"An error occurred: {str(e)}", exc_info=True)
-                await asyncio.sleep(60)
+                self.logger.error(f"Catalog sync failed: {str(e)}", exc_info=True)
+            delay = self.resync_interval
+
+    def monitor_targets(self, markets: List[Market]) -> Dict[str, str]:
+        return {token_id: market.condition_id for market in markets for token_id in monitored_tokens(market)}
 
-    async def check_market(self, condition_id: str, token_id: str):
+    def cycle_targets(self) -> Dict[str, str]:
+        if self.poll_scheduler is None:
+            return dict(self.index.monitored)
+        complements = self.index.complements if self.infer_complements else {}
+        self.poll_scheduler.sync(self.index, self.markets, complements)
+        targets = {}
+        for token_id in self.poll_scheduler.due(time.monotonic()):
+            targets[token_id] = self.index.monitored[token_id]
+            complement = self.index.complement_of.get(token_id) if self.infer_complements else None
+            if complement in self.poll_scheduler.sources:
+                targets[complement] = self.index.monitored[complement]
+        return targets
+
+    async def run_cycle(self, targets: Dict[str, str]) -> bool:
+        if not targets:  # poll-scheduler tick with nothing due
+            return False
+        complements = self.index.complements if self.infer_complements else {}
+        fetch = [BookParams(token_id) for token_id in targets
+                 if token_id not in complements or complements[token_id] not in targets]
+        books = await self.client.get_order_books(fetch)
+        for token_id in targets:
+            source = complements.get(token_id)
+            if source in books and token_id not in books:
+                books[token_id] = complement_book(books[source], token_id)
+        # tokens of a /books chunk that failed are skipped this cycle rather than fetched one by one, which
+        # would turn a degraded API into hundreds of single-book requests
+        missing = len(targets) - sum(1 for token_id in targets if token_id in books)
+        if missing:
+            self.logger.warning(f"No book for {missing} of {len(targets)} tokens, skipping them this cycle")
+            targets = {token_id: condition_id for token_id, condition_id in targets.items() if token_id in books}
+        if self.detector is not None:
+            await self.detect_batch(targets, books)
+        else:
+            await self.scan_markets(targets, books)
+        return True
+
+    async def detect_batch(self, targets: Dict[str, str], books: Dict[str, OrderBook]):
+        start = time.monotonic()
+        checked, skipped = self.books_checked, self.books_skipped
+        for token_id in targets:
+            book = books.get(token_id)
+            if book is not None and (local := self.load_book(token_id, book)) is not None:
+                self.detector.update(self.tokens.ids[token_id], local.top())
+        # resolve slots to token ids before the first await: a catalog sync during an alert can release slots
+        triggered = [(self.tokens.token_ids[index], price_changes, spread_change)
+                     for index, price_changes, spread_change in self.detector.detect()]
+        self.detector.roll()
+        alerted = set()
+        for token_id, price_changes, spread_change in triggered:
+            alerted.add(token_id)
+            if token_id not in self.tokens.ids:  # market closed while earlier alerts were sent
+                continue
+            await self.send_alert(targets[token_id], token_id, price_changes, spread_change)
+        if self.poll_scheduler is not None:
+            for token_id in targets:
+                local = self.tokens.book(token_id)
+                if local is not None:
+                    self.poll_scheduler.observe(token_id, local.top().midpoint, token_id in alerted)
+        self.logger.info(f"Batch-checked {len(targets)} tokens in {time.monotonic() - start:.2f}s ({len(triggered)} alerts, "
+                         f"{self.books_skipped - skipped}/{self.books_checked - checked} books unchanged)")
+
+    async def monitor_markets(self):
+        try:
+            await self.client.init_api_credentials()
+        except Exception as e:
+            self.logger.warning(f"Could not obtain CLOB API credentials, using L1 auth: {str(e)}")
+        self.logger.info("Starting market monitoring...")
+
+        if self.streaming:
+            self.stream = self.client.stream_market(self.on_stream_book, self.on_stream_price_changes)
+        first_due = time.monotonic()
+        if self.load_cached_catalog():
+            # warm start: monitor the cached catalog right away and reconcile with the API in the background
+            self.catalog_sync = asyncio.create_task(self.catalog_sync_loop(0))
+        else:
+            first_due += self.scheduler.period
+            # cold start: check each page while the rest of the catalog loads in the background
+            queue = asyncio.Queue()
+            loader = asyncio.create_task(self.sync_catalog(queue))
+            while (page := await queue.get()) is not None:
+                try:
+                    if self.stream is not None:
+                        self.refresh_subscriptions()
+                    else:
+                        await self.run_cycle(self.monitor_targets(page))
+                except Exception as e:
+                    self.logger.error(f"An error occurred: {str(e)}", exc_info=True)
+            await loader
+            self.catalog_sync = asyncio.create_task(self.catalog_sync_loop(self.resync_interval))
+
+        if self.stream is not None:
+            await self.scheduler.run(self.stream_cycle, first_due)
+        else:
+            await self.scheduler.run(lambda: self.run_cycle(self.cycle_targets()), first_due)
+
+    def refresh_subscriptions(self):
+        if self.index.version == self._subscribed_version:
+            return
+        complements = self.index.complements if self.infer_complements else {}
+        monitored = self.index.monitored
+        self.stream.set_assets(token_id for token_id in monitored
+                               if token_id not in complements or complements[token_id] not in monitored)
+        self._subscribed_version = self.index.version
+
+    async def stream_cycle(self):
+        # alerts compare each streamed book with its top of book as of the previous cycle
+        self.refresh_subscriptions()
+        tokens, monitored = self.tokens, self.index.monitored
+        for token_id in [token_id for token_id in tokens.ids if token_id not in monitored]:
+            self.release_token(token_id)
+        self.stale &= monitored.keys()
+        for token_id in self.stale:  # retry resyncs that failed
+            self.start_resync(token_id)
+        for index in [index for index, local in enumerate(tokens.books) if local is not None]:
+            tokens.baselines[index] = top = tokens.books[index].top()
+            complement = self.index.complement_of.get(tokens.token_ids[index]) if self.infer_complements else None
+            if complement is not None:
+                tokens.baselines[tokens.id(complement)] = complement_top(top)
+
+    async def on_stream_book(self, book: OrderBook):
+        if book.asset_id in self.index.monitored:
+            self.stale.discard(book.asset_id)
+            local = self.load_book(book.asset_id, book)
+            if local is not None:
+                await self.check_streamed_top(book.asset_id, local.top())
+
+    async def on_stream_price_changes(self, changes: List[PriceChange]):
+        by_asset: Dict[str, List[PriceChange]] = {}
+        for change in changes:
+            by_asset.setdefault(change.asset_id, []).append(change)
+        for asset_id, asset_changes in by_asset.items():
+            local = self.tokens.book(asset_id)
+            if local is None:  # deltas before the first snapshot are dropped; the snapshot supersedes them
+                continue
+            if not local.apply_changes(asset_changes):
+                # drop the diverged book, so deltas are discarded until a snapshot arrives, and fetch that
+                # snapshot outside the shard's read loop
+                self.book_resyncs += 1
+                self.logger.info(f"Book hash mismatch for {asset_id}, resyncing from snapshot")
+                self.tokens.books[self.tokens.ids[asset_id]] = None
+                self.stale.add(asset_id)
+                self.start_resync(asset_id)
+                continue
+            await self.check_streamed_top(asset_id, local.top())
+
+    def start_resync(self, asset_id: str):
+        if asset_id not in self.resyncs:
+            self.resyncs[asset_id] = asyncio.create_task(self.resync_book(asset_id))
+
+    async def resync_book(self, asset_id: str):
+        try:
+            snapshot = await self.client.get_order_book(asset_id)
+        except Exception as e:
+            self.logger.warning(f"Book resync failed for {asset_id}: {e!r}")
+            return
+        finally:
+            self.resyncs.pop(asset_id, None)
+        if asset_id in self.stale:  # a streamed snapshot may have arrived in the meantime
+            await self.on_stream_book(snapshot)
+
+    async def check_streamed_top(self, token_id: str, top: TopOfBook):
+        condition_id = self.index.monitored.get(token_id)
+        if condition_id is None:
+            return
+        await self.check_top(condition_id, token_id, top, update_baseline=False)
+        complement = self.index.complement_of.get(token_id) if self.infer_complements else None
+        if complement in self.index.monitored:
+            await self.check_top(condition_id, complement, complement_top(top), update_baseline=False)
+
+    async def close(self):
+        if self.catalog_sync is not None:
+            self.catalog_sync.cancel()
+        if self.stream is not None:
+            await self.stream.close()
+        for task in list(self.resyncs.values()):
+            task.cancel()
+        await self.client.close()
+        self.catalog.close()
+
+    async def scan_markets(self, targets: Dict[str, str], books: Dict[str, OrderBook]) -> Dict[str, Optional[Exception]]:
+        # targets maps token_id -> condition_id; run_cycle only passes tokens it has a book for
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(token_id: str, condition_id: str):
+            async with semaphore:
+                try:
+                    await asyncio.wait_for(self.check_market(condition_id, token_id, books[token_id]), self.check_timeout)
+                    return token_id, None
+                except Exception as e:
+                    return token_id, e
+
+        start = time.monotonic()
+        checked, skipped = self.books_checked, self.books_skipped
+        results = {}
+        tasks = [asyncio.create_task(run(token_id, condition_id)) for token_id, condition_id in targets.items()]
+        for future in asyncio.as_completed(tasks):
+            token_id, error = await future
+            results[token_id] = error
+            if error is not None:
+                self.logger.warning(f"Check failed for token {token_id}: {error!r}")
+        failed = sum(1 for error in results.values() if error is not None)
+        self.logger.info(f"Scanned {len(results)} tokens in {time.monotonic() - start:.2f}s ({failed} failed, "
+                         f"{self.books_skipped - skipped}/{self.books_checked - checked} books unchanged)")
+        return results
+
+    async def check_market(self, condition_id: str, token_id: str, book: Optional[OrderBook] = None,
+                           update_baseline: bool = True) -> bool:
         self.logger.debug(f"Checking market: {condition_id}")
-        book = await self.client.get_order_book(token_id)
-        spread = await self.client.get_spread(token_id)
+        if book is None:  # direct callers only; scan_markets always passes the batch-fetched book
+            book = await self.client.get_order_book(token_id)
+        local = self.load_book(token_id, book)
+        if local is None:
+            if self.poll_scheduler is not None:
+                self.poll_scheduler.observe(token_id, self.tokens.book(token_id).top().midpoint, False)
+            return False
+        return await self.check_top(condition_id, token_id, local.top(), update_baseline)
 
-        price_changes = self.calculate_price_changes(self.previous_books.get(token_id), book)
-        spread_change = self.calculate_spread_change(self.previous_spreads.get(token_id), spread)
+    def load_book(self, token_id: str, snapshot: OrderBook) -> Optional[LocalBook]:
+        # None when the snapshot matches the book already held, so there is nothing to diff
+        self.books_checked += 1
+        index = self.tokens.id(token_id)
+        local = self.tokens.books[index]
+        if local is None:
+            local = self.tokens.books[index] = LocalBook(snapshot)
+        elif local.matches(snapshot):
+            self.books_skipped += 1
+            return None
+        else:
+            local.load(snapshot)
+        return local
 
-        if price_changes or spread_change:
-            await self.send_alert(condition_id, token_id, price_changes, spread_change)
+    async def check_top(self, condition_id: str, token_id: str, top: TopOfBook, update_baseline: bool = True) -> bool:
+        spread = top.spread
+        if self.cross_check_spread:
+            server_spread = await self.client.get_spread(token_id)
+            if spread != server_spread:
+                self.logger.warning(f"Spread mismatch for {token_id}: book={format_fixed(spread) if spread is not None else None} "
+                                    f"server={format_fixed(server_spread)}")
+
+        index = self.tokens.id(token_id)
+        previous = self.tokens.baselines[index]
+        price_changes = self.calculate_price_changes(previous, top)
+        spread_change = self.calculate_spread_change(previous.spread if previous else None, spread)
 
-        self.previous_books[token_id] = book
-        self.previous_spreads[token_id] = spread
+        alerted = bool(price_changes or spread_change)
+        # without update_baseline the previous top of book is kept until the next alert or cycle; it is set
+        # before the alert is awaited, while index still belongs to this token
+        if update_baseline or alerted or previous is None:
+            self.tokens.baselines[index] = top
+        if alerted:
+            await self.send_alert(condition_id, token_id, price_changes, spread_change)
+        if self.poll_scheduler is not None:
+            self.poll_scheduler.observe(token_id, top.midpoint, alerted)
+        return alerted
 
-    def calculate_price_changes(self, previous_book: Optional[Dict], current_book: Dict) -> Dict:
+    def calculate_price_changes(self, previous_top: Optional[TopOfBook], current_top: TopOfBook) -> Dict:
         changes = {}
-        if previous_book:
-            for side in ["bids", "asks"]:
-                prev_best = Decimal(previous_book[side][0]["price"]) if previous_book[side] else Decimal('0')
-                curr_best = Decimal(current_book[side][0]["price"]) if current_book[side] else Decimal('0')
-                if prev_best != 0:
-                    change_percent = (curr_best - prev_best) / prev_best * 100
-                    if abs(change_percent) >= 15:  # 15% threshold
-                        changes[side] = change_percent
+        if previous_top:
+            for side, prev_best, curr_best in [("bids", previous_top.best_bid, current_top.best_bid),
+                                               ("asks", previous_top.best_ask, current_top.best_ask)]:
+                prev_best = prev_best or 0
+                curr_best = curr_best or 0
+                # |curr - prev| * 100 >= threshold * prev decides the threshold in exact integer math
+                if prev_best != 0 and abs(curr_best - prev_best) * 100 >= PRICE_CHANGE_THRESHOLD * prev_best:
+                    changes[side] = (curr_best - prev_best) * 100 / prev_best
         return changes
 
-    def calculate_spread_change(self, previous_spread: Optional[Decimal], current_spread: Decimal) -> Optional[Decimal]:
-        if previous_spread:
-            change_percent = (current_spread - previous_spread) / previous_spread * 100
-            if abs(change_percent) >= 50:  # 50% threshold for spread changes
-                return change_percent
+    def calculate_spread_change(self, previous_spread: Optional[int], current_spread: Optional[int]) -> Optional[float]:
+        if previous_spread and current_spread is not None:
+            if abs(current_spread - previous_spread) * 100 >= SPREAD_CHANGE_THRESHOLD * abs(previous_spread):
+                return (current_spread - previous_spread) * 100 / previous_spread
         return None
 
-    async def send_alert(self, condition_id: str, token_id: str, price_changes: Dict, spread_change: Optional[Decimal]):
+    async def send_alert(self, condition_id: str, token_id: str, price_changes: Dict, spread_change: Optional[float]):
         market = self.markets[condition_id]
-        message = f"🚨 Significant changes in market: {market.description}\n"
+        description = market.description or self.catalog.load_cold_fields(condition_id)["description"]
+        message = f"🚨 Significant changes in market: {description}\n"
         message += f"Market ID: {condition_id}\n"
         message += f"Token ID: {token_id}\n"
+        outcome = next((token.get("outcome") for token in market.tokens if token["token_id"] == token_id), None)
+        if outcome:
+            message += f"Outcome: {outcome}\n"
         for side, change in price_changes.items():
             message += f"{side.capitalize()} price: {change:.2f}% change\n"
         if spread_change:
@@ -230,7 +1731,7 @@ async def main():
     try:
         await monitor.monitor_markets()
     finally:
-        await monitor.client.close()
+        await monitor.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,68 @@
+import sys
+import types
+import unittest
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # polybot reads its settings from a local config.py that is not part of the repository
+    config = types.ModuleType("config")
+    config.PRIVATE_KEY = config.POLYGON_RPC_URL = config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_CHAT_ID = None
+    sys.modules["config"] = config
+
+import aiohttp
+
+from benchmarks import BENCH_KEY, serve_markets, synthetic_market
+from polybot import PolymarketClient
+
+PORT = 18093
+MARKETS = [synthetic_market(i) for i in range(95)]
+
+
+class MarketPagesTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = PolymarketClient(BENCH_KEY, "http://127.0.0.1:1", backoff_base=0.001)
+        self.client.base_url = f"http://127.0.0.1:{PORT}"
+
+    async def asyncTearDown(self):
+        await self.client.close()
+
+    async def walk(self, fan_out: int = 4, **kwargs) -> list:
+        runner = await serve_markets(MARKETS, 10, PORT, **kwargs)
+        try:
+            return [market.condition_id async for page in self.client.iter_market_pages(fan_out)
+                    for market in page.markets]
+        finally:
+            await runner.cleanup()
+
+    def assertWholeCatalog(self, condition_ids: list):
+        self.assertEqual(condition_ids, [market["condition_id"] for market in MARKETS])
+
+    async def test_fans_out_predicted_cursors(self):
+        offsets = []
+        self.assertWholeCatalog(await self.walk(offsets=offsets))
+        # 10 pages, the last fan-out round overshoots the catalog by two pages
+        self.assertEqual(offsets, [0] + list(range(10, 130, 10)))
+
+    async def test_falls_back_to_sequential_on_cursor_mismatch(self):
+        offsets = []
+        self.assertWholeCatalog(await self.walk(offsets=offsets, short_page=20))
+        # the page at 20 ends at 29, so the walk follows the returned cursors from there
+        self.assertEqual(offsets, [0, 10, 20, 30, 40] + list(range(29, 95, 10)))
+
+    async def test_falls_back_to_sequential_on_undecodable_cursor(self):
+        offsets = []
+        self.assertWholeCatalog(await self.walk(offsets=offsets, opaque=True))
+        self.assertEqual(offsets, list(range(0, 95, 10)))
+
+    async def test_ignores_errors_past_the_end(self):
+        self.assertWholeCatalog(await self.walk(fail_from=len(MARKETS)))
+
+    async def test_raises_errors_before_the_end(self):
+        with self.assertRaises(aiohttp.ClientResponseError) as raised:
+            await self.walk(fail_from=50)
+        self.assertEqual(raised.exception.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
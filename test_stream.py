@@ -0,0 +1,228 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # polybot reads its settings from a local config.py that is not part of the repository
+    config = types.ModuleType("config")
+    config.PRIVATE_KEY = config.POLYGON_RPC_URL = config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_CHAT_ID = None
+    sys.modules["config"] = config
+
+import aiohttp
+
+from benchmarks import BENCH_KEY, serve_book, serve_market_channel, synthetic_book, synthetic_market
+from polybot import LocalBook, MarketStream, OrderbookMonitor, PriceChange, decode_book, decode_market, parse_fixed
+
+PORT = 18091
+URL = f"http://127.0.0.1:{PORT}/ws/market"
+BOOK_PORT = 18092
+
+
+async def wait_until(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met before timeout")
+        await asyncio.sleep(0.02)
+
+
+def hashed(event: dict) -> dict:
+    # gives a book event the hash the server would compute for it
+    event = {**event, "hash": ""}
+    event["hash"] = LocalBook(decode_book(event)).compute_hash()
+    return event
+
+
+class MarketStreamTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.books = []
+        self.changes = []
+        self.session = aiohttp.ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+
+    def stream(self, **kwargs) -> MarketStream:
+        async def on_book(book):
+            self.books.append(book)
+
+        async def on_price_change(changes):
+            self.changes.extend(changes)
+
+        return MarketStream(self.session, URL, on_book, on_price_change, **kwargs)
+
+    async def test_reconnects_after_server_close(self):
+        subscriptions = []
+        runner = await serve_market_channel(1, PORT, subscriptions=subscriptions, close_first=1)
+        stream = self.stream()
+        try:
+            stream.set_assets(["a", "b"])
+            await wait_until(lambda: len(self.books) == 4)
+            self.assertGreaterEqual(stream.reconnects, 1)
+            self.assertEqual(subscriptions, [["a", "b"], ["a", "b"]])
+        finally:
+            await stream.close()
+            await runner.cleanup()
+
+    async def test_reconnects_on_heartbeat_loss(self):
+        subscriptions = []
+        runner = await serve_market_channel(0, PORT, subscriptions=subscriptions, mute_first=1)
+        stream = self.stream(ping_interval=0.1)
+        try:
+            stream.set_assets(["a"])
+            await wait_until(lambda: len(self.books) == 1)
+            self.assertGreaterEqual(stream.reconnects, 1)
+            self.assertEqual(subscriptions, [["a"]])  # only the second connection answered
+        finally:
+            await stream.close()
+            await runner.cleanup()
+
+    async def test_skips_non_json_frames(self):
+        runner = await serve_market_channel(0, PORT, junk_first=1)
+        stream = self.stream()
+        try:
+            stream.set_assets(["a"])
+            await wait_until(lambda: len(self.books) == 1)
+            self.assertEqual(stream.reconnects, 0)
+            self.assertFalse(stream.shards[0].task.done())
+        finally:
+            await stream.close()
+            await runner.cleanup()
+
+    async def test_shards_and_resubscribes_changed_membership(self):
+        subscriptions = []
+        runner = await serve_market_channel(0, PORT, subscriptions=subscriptions)
+        stream = self.stream(shard_size=2)
+        try:
+            stream.set_assets(["a", "b", "c", "d", "e"])
+            await wait_until(lambda: len(subscriptions) == 3)
+            self.assertEqual(sorted(subscriptions), [["a", "b"], ["c", "d"], ["e"]])
+
+            # d and e leave, f joins: only the shard of c and d is resubscribed, the shard of e closes
+            stream.set_assets(["a", "b", "c", "f"])
+            await wait_until(lambda: len(subscriptions) == 4)
+            await asyncio.sleep(0.1)
+            self.assertEqual(subscriptions[3], ["c", "f"])
+            self.assertEqual(len(subscriptions), 4)
+            self.assertEqual([shard.assets for shard in stream.shards], [["a", "b"], ["c", "f"]])
+            self.assertEqual(stream.subscribed, {"a", "b", "c", "f"})
+        finally:
+            await stream.close()
+            await runner.cleanup()
+
+
+class StreamingMonitorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_streamed_deltas_raise_alerts(self):
+        # each asset's best bid moves from 0.20 to 0.30 (+50%) with the first non-empty delta
+        runner = await serve_market_channel(2, PORT, price="0.30")
+        with tempfile.TemporaryDirectory() as tmp:
+            monitor = OrderbookMonitor(BENCH_KEY, "http://127.0.0.1:1", "1:x", "1",
+                                       catalog_path=os.path.join(tmp, "markets.db"), streaming=True)
+            alerts = []
+
+            async def send_alert(condition_id, token_id, price_changes, spread_change):
+                alerts.append((condition_id, token_id, price_changes, spread_change))
+
+            monitor.send_alert = send_alert
+            try:
+                markets = [decode_market(synthetic_market(i)) for i in range(3)]
+                monitor.apply_catalog_page(markets)
+                monitor.client.ws_url = URL
+                monitor.stream = monitor.client.stream_market(monitor.on_stream_book, monitor.on_stream_price_changes)
+                monitor.refresh_subscriptions()
+                # complements are inferred, so only each market's first token is streamed
+                self.assertEqual(monitor.stream.subscribed, {market.tokens[0]["token_id"] for market in markets})
+
+                await wait_until(lambda: len(alerts) == len(markets))
+                await asyncio.sleep(0.1)
+                self.assertEqual(sorted(alerts), sorted((market.condition_id, market.tokens[0]["token_id"],
+                                                         {"bids": 50.0}, None) for market in markets))
+            finally:
+                await monitor.close()
+                await runner.cleanup()
+
+
+class BookResyncTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.monitor = OrderbookMonitor(BENCH_KEY, "http://127.0.0.1:1", "1:x", "1",
+                                        catalog_path=os.path.join(self.tmp.name, "markets.db"), streaming=True)
+        self.monitor.client.base_url = f"http://127.0.0.1:{BOOK_PORT}"
+        self.monitor.apply_catalog_page([decode_market(synthetic_market(0))])
+        self.snapshot = hashed(synthetic_book(0))
+        self.asset_id = self.snapshot["asset_id"]
+
+    async def asyncTearDown(self):
+        await self.monitor.close()
+        self.tmp.cleanup()
+
+    def change(self, side: str, price: str, size: str, hash: str) -> PriceChange:
+        return PriceChange(self.asset_id, side, parse_fixed(price), parse_fixed(size), hash, "2")
+
+    def test_local_book_applies_inserts_and_deletes(self):
+        book = LocalBook(decode_book(self.snapshot))
+        self.assertTrue(book.verifiable)
+        self.assertTrue(book.in_sync())
+
+        # a new best bid is inserted and the 0.01 bid level removed
+        expected = {**self.snapshot, "timestamp": "2",
+                    "bids": self.snapshot["bids"][1:] + [{"price": "0.5", "size": "10"}]}
+        changes = [self.change("BUY", "0.50", "10", None), self.change("BUY", "0.01", "0", hashed(expected)["hash"])]
+        self.assertTrue(book.apply_changes(changes))
+        self.assertEqual(book.bid_prices, sorted(book.bid_prices))
+        self.assertEqual((book.bid_prices[0], book.best_bid), (parse_fixed("0.02"), parse_fixed("0.5")))
+        self.assertNotIn(parse_fixed("0.01"), book.bid_sizes)
+
+        self.assertFalse(book.apply_changes([self.change("SELL", "0.99", "1", "0" * 40)]))
+
+    async def test_mismatched_delta_resyncs_from_rest(self):
+        rest = hashed({**synthetic_book(0), "timestamp": "3"})
+        runner = await serve_book({self.asset_id: rest}, BOOK_PORT)
+        try:
+            await self.monitor.on_stream_book(decode_book(self.snapshot))
+            await self.monitor.on_stream_price_changes([self.change("BUY", "0.50", "10", "0" * 40)])
+            self.assertIsNone(self.monitor.tokens.book(self.asset_id))
+            self.assertEqual(self.monitor.book_resyncs, 1)
+
+            # deltas for the dropped book are ignored until the snapshot is back
+            await self.monitor.on_stream_price_changes([self.change("BUY", "0.60", "10", "0" * 40)])
+            self.assertEqual(self.monitor.book_resyncs, 1)
+
+            await wait_until(lambda: not self.monitor.resyncs)
+            book = self.monitor.tokens.book(self.asset_id)
+            self.assertEqual(book.hash, rest["hash"])
+            self.assertTrue(book.in_sync())
+            self.assertNotIn(self.asset_id, self.monitor.stale)
+        finally:
+            await runner.cleanup()
+
+    async def test_streamed_snapshot_wins_resync_race(self):
+        gate = asyncio.Event()
+        rest = hashed({**synthetic_book(0), "timestamp": "3"})
+        runner = await serve_book({self.asset_id: rest}, BOOK_PORT, gate)
+        try:
+            await self.monitor.on_stream_book(decode_book(self.snapshot))
+            await self.monitor.on_stream_price_changes([self.change("BUY", "0.50", "10", "0" * 40)])
+            self.assertIn(self.asset_id, self.monitor.resyncs)
+
+            streamed = hashed({**synthetic_book(0), "timestamp": "4"})
+            await self.monitor.on_stream_book(decode_book(streamed))
+            checked = self.monitor.books_checked
+            gate.set()
+            await wait_until(lambda: not self.monitor.resyncs)
+
+            # the older REST snapshot is not installed over the streamed one
+            self.assertEqual(self.monitor.tokens.book(self.asset_id).hash, streamed["hash"])
+            self.assertEqual(self.monitor.books_checked, checked)
+        finally:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()